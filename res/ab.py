@@ -1,16 +1,20 @@
 #!/usr/bin/env python3
 
-import requests
 import argparse
+import csv
 import json
+import sys
 from datetime import datetime, timedelta
 
+import api_client
+import bulk
+
 
 def get_personal_ab(url, token):
     """Get personal address book GUID"""
     headers = {"Authorization": f"Bearer {token}"}
     
-    response = requests.get(f"{url}/api/ab/personal", headers=headers)
+    response = api_client.get(f"{url}/api/ab/personal", headers=headers)
     
     if response.status_code != 200:
         return f"Error: {response.status_code} - {response.text}"
@@ -21,7 +25,6 @@ def get_personal_ab(url, token):
 def view_shared_abs(url, token, name=None):
     """View all shared address books (excluding personal ones)"""
     headers = {"Authorization": f"Bearer {token}"}
-    pageSize = 30
     params = {
         "name": name,
     }
@@ -31,32 +34,8 @@ def view_shared_abs(url, token, name=None):
         for k, v in params.items()
         if v is not None
     }
-    filtered_params["pageSize"] = pageSize
-
-    abs = []
-    current = 0
-
-    while True:
-        current += 1
-        filtered_params["current"] = current
-        response = requests.get(f"{url}/api/ab/shared/profiles", headers=headers, params=filtered_params)
-        if response.status_code != 200:
-            print(f"Error: HTTP {response.status_code} - {response.text}")
-            exit(1)
-        
-        response_json = response.json()
-        if "error" in response_json:
-            print(f"Error: {response_json['error']}")
-            exit(1)
-
-        data = response_json.get("data", [])
-        abs.extend(data)
 
-        total = response_json.get("total", 0)
-        if len(data) < pageSize or current * pageSize >= total:
-            break
-
-    return abs
+    return api_client.fetch_pages(f"{url}/api/ab/shared/profiles", headers, filtered_params)
 
 
 def get_ab_by_name(url, token, ab_name):
@@ -71,7 +50,6 @@ def get_ab_by_name(url, token, ab_name):
 def view_ab_peers(url, token, ab_guid, peer_id=None, alias=None):
     """View peers in an address book"""
     headers = {"Authorization": f"Bearer {token}"}
-    pageSize = 30
     params = {
         "ab": ab_guid,
         "id": peer_id,
@@ -83,38 +61,14 @@ def view_ab_peers(url, token, ab_guid, peer_id=None, alias=None):
         for k, v in params.items()
         if v is not None
     }
-    filtered_params["pageSize"] = pageSize
-
-    peers = []
-    current = 0
-
-    while True:
-        current += 1
-        filtered_params["current"] = current
-        response = requests.get(f"{url}/api/ab/peers", headers=headers, params=filtered_params)
-        if response.status_code != 200:
-            print(f"Error: HTTP {response.status_code} - {response.text}")
-            exit(1)
-        
-        response_json = response.json()
-        if "error" in response_json:
-            print(f"Error: {response_json['error']}")
-            exit(1)
 
-        data = response_json.get("data", [])
-        peers.extend(data)
-
-        total = response_json.get("total", 0)
-        if len(data) < pageSize or current * pageSize >= total:
-            break
-
-    return peers
+    return api_client.fetch_pages(f"{url}/api/ab/peers", headers, filtered_params)
 
 
 def view_ab_tags(url, token, ab_guid):
     """View tags in an address book"""
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(f"{url}/api/ab/tags/{ab_guid}", headers=headers)
+    response = api_client.get(f"{url}/api/ab/tags/{ab_guid}", headers=headers)
     response_json = check_response(response)
     
     # Format color values as hex
@@ -167,7 +121,7 @@ def add_peer(url, token, ab_guid, peer_id, alias=None, note=None, tags=None, pas
     if info:
         payload.update(info)
     
-    response = requests.post(f"{url}/api/ab/peer/add/{ab_guid}", headers=headers, json=payload)
+    response = api_client.post(f"{url}/api/ab/peer/add/{ab_guid}", headers=headers, json=payload)
     return check_response(response)
 
 
@@ -178,7 +132,7 @@ def delete_peer(url, token, ab_guid, peer_ids):
     
     print(f"Deleting peers {peer_ids} from address book")
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.delete(f"{url}/api/ab/peer/{ab_guid}", headers=headers, json=peer_ids)
+    response = api_client.delete(f"{url}/api/ab/peer/{ab_guid}", headers=headers, json=peer_ids)
     return check_response(response)
 
 def update_peer(url, token, ab_guid, peer_id, alias=None, note=None, tags=None, password=None):
@@ -210,35 +164,68 @@ def update_peer(url, token, ab_guid, peer_id, alias=None, note=None, tags=None,
     if note is not None:
         payload["note"] = note
     
-    response = requests.put(f"{url}/api/ab/peer/update/{ab_guid}", headers=headers, json=payload)
+    response = api_client.put(f"{url}/api/ab/peer/update/{ab_guid}", headers=headers, json=payload)
     return check_response(response)
 
 
+def parse_tags(value):
+    """Parse tags given as 'tag1,tag2' or '[tag1,tag2]'; '[]' clears tags, None keeps them"""
+    if value is None:
+        return None
+    if value == "[]":
+        return []  # Empty list to clear tags
+    # Remove brackets if present and split by comma
+    tags_str = value.strip()
+    if tags_str.startswith('[') and tags_str.endswith(']'):
+        tags_str = tags_str[1:-1]  # Remove brackets
+    return [tag.strip() for tag in tags_str.split(",") if tag.strip()]
+
+
+def post_peer(url, token, ab_guid, peer):
+    """Add a peer given as a dict (id, alias, note, tags, password); raise ApiError on error"""
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {"id": str(peer["id"]), "note": peer.get("note")}
+    for key in ("alias", "tags", "password"):
+        if peer.get(key):
+            payload[key] = peer[key]
+    r = api_client.post(f"{url}/api/ab/peer/add/{ab_guid}", headers=headers, json=payload)
+    return api_client.parse_response(r)
+
+
+TAG_COLORS = {
+    "red": 0xFFFF0000,
+    "green": 0xFF008000,
+    "blue": 0xFF0000FF,
+    "orange": 0xFFFF9800,
+    "purple": 0xFF9C27B0,
+    "grey": 0xFF9E9E9E,
+    "cyan": 0xFF00BCD4,
+    "lime": 0xFFCDDC39,
+    "teal": 0xFF009688,
+    "pink": 0xFFF48FB1,
+    "indigo": 0xFF3F51B5,
+    "brown": 0xFF795548,
+}
+TAG_COLOR_LIST = list(TAG_COLORS.values())
+
+
+def color_to_int(value):
+    """Tag colors come back from view_ab_tags as '0xAARRGGBB' strings"""
+    if isinstance(value, str):
+        return int(value, 16) if value.lower().startswith("0x") else int(value)
+    return value
+
+
 def str2color(tag_name, existing_colors=None):
     """Generate color for tag name similar to str2color2 function"""
     if existing_colors is None:
-        existing_colors = []
-    
-    color_map = {
-        "red": 0xFFFF0000,
-        "green": 0xFF008000,
-        "blue": 0xFF0000FF,
-        "orange": 0xFFFF9800,
-        "purple": 0xFF9C27B0,
-        "grey": 0xFF9E9E9E,
-        "cyan": 0xFF00BCD4,
-        "lime": 0xFFCDDC39,
-        "teal": 0xFF009688,
-        "pink": 0xFFF48FB1,
-        "indigo": 0xFF3F51B5,
-        "brown": 0xFF795548,
-    }
+        existing_colors = set()
     
     lower_name = tag_name.lower()
     
     # Check if tag name matches a predefined color
-    if lower_name in color_map:
-        return color_map[lower_name]
+    if lower_name in TAG_COLORS:
+        return TAG_COLORS[lower_name]
     
     # Special case for yellow
     if lower_name == "yellow":
@@ -249,13 +236,12 @@ def str2color(tag_name, existing_colors=None):
     for char in tag_name:
         hash_value += ord(char)
     
-    color_list = list(color_map.values())
-    hash_value = hash_value % len(color_list)
-    result = color_list[hash_value]
+    hash_value = hash_value % len(TAG_COLOR_LIST)
+    result = TAG_COLOR_LIST[hash_value]
     
     # If color is already used, try to find an unused one
     if result in existing_colors:
-        for color in color_list:
+        for color in TAG_COLOR_LIST:
             if color not in existing_colors:
                 result = color
                 break
@@ -263,31 +249,81 @@ def str2color(tag_name, existing_colors=None):
     return result
 
 
-def add_tag(url, token, ab_guid, tag_name, color=None):
+def assign_tag_colors(tags, existing_tags):
+    """
+    Pick colors for new tags in one pass.
+
+    `tags` maps tag name -> color (None to generate one); `existing_tags` is
+    the result of view_ab_tags. Tags that already exist are skipped. Returns
+    a list of {"name", "color"} payloads for the tags to add.
+    """
+    existing_names = {tag["name"] for tag in existing_tags}
+    used_colors = {color_to_int(tag.get("color")) for tag in existing_tags}
+    new_tags = []
+    for name, color in tags.items():
+        if name in existing_names:
+            continue
+        if color is None:
+            color = str2color(name, used_colors)
+        used_colors.add(color)
+        new_tags.append({"name": name, "color": color})
+    return new_tags
+
+
+def add_tag(url, token, ab_guid, tag_name, color=None, existing_colors=None):
     """Add a tag to address book"""
     print(f"Adding tag '{tag_name}' to address book")
     headers = {"Authorization": f"Bearer {token}"}
     
     # If no color specified, generate one based on tag name
     if color is None:
-        # Get existing tags to avoid color conflicts
-        try:
-            existing_tags = view_ab_tags(url, token, ab_guid)
-            existing_colors = [tag.get("color", 0) for tag in existing_tags]
-            color = str2color(tag_name, existing_colors)
-        except:
-            # Fallback to default color if we can't get existing tags
-            color = str2color(tag_name)
+        if existing_colors is None:
+            # Get existing tags to avoid color conflicts
+            try:
+                existing_tags = view_ab_tags(url, token, ab_guid)
+                existing_colors = {color_to_int(tag.get("color", 0)) for tag in existing_tags}
+            except:
+                # Fallback to default color if we can't get existing tags
+                existing_colors = set()
+        color = str2color(tag_name, existing_colors)
     
     payload = {
         "name": tag_name,
         "color": color,
     }
     
-    response = requests.post(f"{url}/api/ab/tag/add/{ab_guid}", headers=headers, json=payload)
+    response = api_client.post(f"{url}/api/ab/tag/add/{ab_guid}", headers=headers, json=payload)
     return check_response(response)
 
 
+def add_tags(url, token, ab_guid, tag_names, color=None, concurrency=1, rate=None):
+    """
+    Add several tags to an address book.
+
+    Existing tags are fetched once, colors for all new tags are assigned in
+    one pass and the tags are submitted concurrently. Returns the number of
+    tags that failed.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    existing_tags = view_ab_tags(url, token, ab_guid)
+    new_tags = assign_tag_colors(dict.fromkeys(tag_names, color), existing_tags)
+    skipped = len(set(tag_names)) - len(new_tags)
+    if skipped:
+        print(f"Skipping {skipped} tag(s) that already exist")
+    if not new_tags:
+        return 0
+
+    def add(tag):
+        r = api_client.post(f"{url}/api/ab/tag/add/{ab_guid}", headers=headers, json=tag)
+        return api_client.parse_response(r)
+
+    _, failures = bulk.run_bulk(
+        add, new_tags, concurrency=concurrency, rate=rate,
+        label="Add tag", describe=lambda tag: tag["name"]
+    )
+    return len(failures)
+
+
 def update_tag(url, token, ab_guid, tag_name, color):
     """Update a tag in address book"""
     print(f"Updating tag '{tag_name}' in address book")
@@ -298,7 +334,7 @@ def update_tag(url, token, ab_guid, tag_name, color):
         "color": color,
     }
     
-    response = requests.put(f"{url}/api/ab/tag/update/{ab_guid}", headers=headers, json=payload)
+    response = api_client.put(f"{url}/api/ab/tag/update/{ab_guid}", headers=headers, json=payload)
     return check_response(response)
 
 
@@ -309,7 +345,7 @@ def delete_tags(url, token, ab_guid, tag_names):
     
     print(f"Deleting tags {tag_names} from address book")
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.delete(f"{url}/api/ab/tag/{ab_guid}", headers=headers, json=tag_names)
+    response = api_client.delete(f"{url}/api/ab/tag/{ab_guid}", headers=headers, json=tag_names)
     return check_response(response)
 
 
@@ -329,7 +365,7 @@ def add_shared_ab(url, token, name, note=None, password=None):
             "password": password
         }
     
-    response = requests.post(f"{url}/api/ab/shared/add", headers=headers, json=payload)
+    response = api_client.post(f"{url}/api/ab/shared/add", headers=headers, json=payload)
     return check_response(response)
 
 
@@ -358,7 +394,7 @@ def update_shared_ab(url, token, ab_guid, name=None, note=None, owner=None, pass
             "password": password
         }
     
-    response = requests.put(f"{url}/api/ab/shared/update/profile", headers=headers, json=payload)
+    response = api_client.put(f"{url}/api/ab/shared/update/profile", headers=headers, json=payload)
     return check_response(response)
 
 
@@ -369,7 +405,7 @@ def delete_shared_abs(url, token, ab_guids):
     
     print(f"Deleting shared address books {ab_guids}")
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.delete(f"{url}/api/ab/shared", headers=headers, json=ab_guids)
+    response = api_client.delete(f"{url}/api/ab/shared", headers=headers, json=ab_guids)
     return check_response(response)
 
 
@@ -396,34 +432,11 @@ def string_to_permission(permission_str):
 def view_ab_rules(url, token, ab_guid):
     """View rules in an address book"""
     headers = {"Authorization": f"Bearer {token}"}
-    pageSize = 30
     params = {
         "ab": ab_guid,
-        "pageSize": pageSize,
     }
 
-    rules = []
-    current = 0
-
-    while True:
-        current += 1
-        params["current"] = current
-        response = requests.get(f"{url}/api/ab/rules", headers=headers, params=params)
-        if response.status_code != 200:
-            print(f"Error: HTTP {response.status_code} - {response.text}")
-            exit(1)
-        
-        response_json = response.json()
-        if "error" in response_json:
-            print(f"Error: {response_json['error']}")
-            exit(1)
-
-        data = response_json.get("data", [])
-        rules.extend(data)
-
-        total = response_json.get("total", 0)
-        if len(data) < pageSize or current * pageSize >= total:
-            break
+    rules = api_client.fetch_pages(f"{url}/api/ab/rules", headers, params)
 
     # Convert numeric permissions to string format
     for rule in rules:
@@ -451,7 +464,7 @@ def add_ab_rule(url, token, ab_guid, rule_type, user=None, group=None, rule=1):
         # For everyone, both user and group are None (not included in payload)
         pass
     
-    response = requests.post(f"{url}/api/ab/rule", headers=headers, json=payload)
+    response = api_client.post(f"{url}/api/ab/rule", headers=headers, json=payload)
     return check_response(response)
 
 
@@ -465,7 +478,7 @@ def update_ab_rule(url, token, rule_guid, rule):
         "rule": rule,
     }
     
-    response = requests.patch(f"{url}/api/ab/rule", headers=headers, json=payload)
+    response = api_client.patch(f"{url}/api/ab/rule", headers=headers, json=payload)
     return check_response(response)
 
 
@@ -476,11 +489,258 @@ def delete_ab_rules(url, token, rule_guids):
     
     print(f"Deleting rules {rule_guids}")
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.delete(f"{url}/api/ab/rules", headers=headers, json=rule_guids)
+    response = api_client.delete(f"{url}/api/ab/rules", headers=headers, json=rule_guids)
     return check_response(response)
 
 
-def main():
+def load_peer_file(path):
+    """
+    Load a desired address book state from YAML or JSON:
+
+        peers:
+          - id: "123456789"
+            alias: office-pc
+            note: front desk
+            tags: [office]
+            password: secret    # only used when the peer is added
+        tags:                   # optional, tags used by peers are implied
+          - name: office
+            color: 0xFF0000FF   # optional
+
+    A top-level list is taken as the peer list.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            print("Error: PyYAML is required for YAML files (pip install pyyaml), or use JSON")
+            exit(1)
+        desired = yaml.safe_load(text)
+    else:
+        desired = json.loads(text)
+    if isinstance(desired, list):
+        desired = {"peers": desired}
+    return desired or {}
+
+
+def peer_fingerprint(peer):
+    """The normalized fields sync compares; passwords are write-only and ignored"""
+    return (
+        peer.get("alias") or "",
+        peer.get("note") or "",
+        tuple(sorted(peer.get("tags") or [])),
+    )
+
+
+def diff_peers(current_peers, desired_peers):
+    """
+    Compare current and desired peers by ID.
+    Returns (to_add, to_update, to_delete_ids, unchanged_count).
+    """
+    current = {str(p["id"]): peer_fingerprint(p) for p in current_peers}
+    to_add, to_update = [], []
+    seen = set()
+    for peer in desired_peers:
+        peer_id = str(peer["id"])
+        seen.add(peer_id)
+        fingerprint = current.get(peer_id)
+        if fingerprint is None:
+            to_add.append(peer)
+        elif fingerprint != peer_fingerprint(peer):
+            to_update.append(peer)
+    to_delete = [peer_id for peer_id in current if peer_id not in seen]
+    unchanged = len(desired_peers) - len(to_add) - len(to_update)
+    return to_add, to_update, to_delete, unchanged
+
+
+def sync_ab(url, token, ab_guid, desired, prune=False, dry_run=False,
+            concurrency=1, rate=None, chunk_size=500):
+    """
+    Reconcile an address book with a desired state (see load_peer_file).
+
+    Current peers and tags are downloaded once, the difference is computed
+    locally and only adds, updates and (with prune) deletes are sent: tags
+    and peers are added/updated concurrently, deletes use the list-accepting
+    endpoints in chunks. Returns the number of failed operations.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    desired_peers = []
+    for peer in desired.get("peers") or []:
+        if peer.get("id") is None:
+            print(f"Error: peer without id in desired state: {peer}")
+            exit(1)
+        peer = dict(peer, id=str(peer["id"]))
+        if isinstance(peer.get("tags"), str):
+            peer["tags"] = [peer["tags"]]
+        desired_peers.append(peer)
+
+    current_peers = view_ab_peers(url, token, ab_guid)
+    current_tags = view_ab_tags(url, token, ab_guid)
+
+    # Tags: explicit ones plus every tag used by a desired peer
+    desired_tags = {}
+    for tag in desired.get("tags") or []:
+        if isinstance(tag, str):
+            tag = {"name": tag}
+        desired_tags[tag["name"]] = tag.get("color")
+    for peer in desired_peers:
+        for name in peer.get("tags") or []:
+            desired_tags.setdefault(name, None)
+    current_tag_names = {tag["name"] for tag in current_tags}
+    tags_to_add = assign_tag_colors(desired_tags, current_tags)
+    tags_to_delete = sorted(current_tag_names - set(desired_tags)) if prune else []
+
+    to_add, to_update, to_delete, unchanged = diff_peers(current_peers, desired_peers)
+    if not prune:
+        extra = len(to_delete)
+        to_delete = []
+    print(
+        f"Plan: {len(to_add)} to add, {len(to_update)} to update, "
+        f"{len(to_delete)} to delete, {unchanged} unchanged; "
+        f"{len(tags_to_add)} tag(s) to add, {len(tags_to_delete)} tag(s) to delete"
+    )
+    if not prune and extra:
+        print(f"{extra} peer(s) not in the desired state are kept (use --prune to delete them)")
+    if dry_run:
+        return 0
+
+    def add_tag_request(tag):
+        r = api_client.post(f"{url}/api/ab/tag/add/{ab_guid}", headers=headers, json=tag)
+        return api_client.parse_response(r)
+
+    def update_peer_request(peer):
+        payload = {
+            "id": peer["id"],
+            "alias": peer.get("alias") or "",
+            "note": peer.get("note") or "",
+            "tags": peer.get("tags") or [],
+        }
+        r = api_client.put(f"{url}/api/ab/peer/update/{ab_guid}", headers=headers, json=payload)
+        return api_client.parse_response(r)
+
+    def delete_chunk_request(chunk):
+        path, ids = chunk
+        r = api_client.delete(f"{url}{path}", headers=headers, json=ids)
+        return api_client.parse_response(r)
+
+    def run(action, items, label, describe):
+        _, failed = bulk.run_bulk(
+            action, items, concurrency=concurrency, rate=rate, label=label, describe=describe
+        )
+        return len(failed)
+
+    failures = 0
+    if tags_to_add:
+        failures += run(add_tag_request, tags_to_add, "Add tag", lambda t: t["name"])
+    chunk_size = max(1, chunk_size)
+    deletes = [
+        (f"/api/ab/peer/{ab_guid}", to_delete[i:i + chunk_size])
+        for i in range(0, len(to_delete), chunk_size)
+    ]
+    if deletes:
+        failures += run(delete_chunk_request, deletes, "Delete peers", lambda c: f"{len(c[1])} peer(s)")
+    if to_add:
+        failures += run(
+            lambda peer: post_peer(url, token, ab_guid, peer), to_add, "Add peer", lambda p: p["id"]
+        )
+    if to_update:
+        failures += run(update_peer_request, to_update, "Update peer", lambda p: p["id"])
+    if tags_to_delete:
+        tag_deletes = [
+            (f"/api/ab/tag/{ab_guid}", tags_to_delete[i:i + chunk_size])
+            for i in range(0, len(tags_to_delete), chunk_size)
+        ]
+        failures += run(delete_chunk_request, tag_deletes, "Delete tags", lambda c: f"{len(c[1])} tag(s)")
+    return failures
+
+
+def iter_peer_rows(path, fmt=None):
+    """
+    Stream peers from a CSV (header: id,alias,note,tags,password) or NDJSON
+    file, or from stdin when path is '-'. Yields (line number, peer dict).
+    """
+    if fmt is None:
+        fmt = "ndjson" if path.endswith((".ndjson", ".jsonl", ".json")) else "csv"
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(stream)
+            for row in reader:
+                peer = {k.strip(): (v.strip() if isinstance(v, str) else v)
+                        for k, v in row.items() if k}
+                if isinstance(peer.get("tags"), str):
+                    peer["tags"] = parse_tags(peer["tags"]) if peer["tags"] else None
+                yield reader.line_num, peer
+        else:
+            for line_num, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    peer = json.loads(line)
+                except ValueError as e:
+                    yield line_num, {"_error": f"invalid JSON: {e}", "_raw": line.rstrip("\n")}
+                    continue
+                if not isinstance(peer, dict):
+                    yield line_num, {"_error": "not a JSON object", "_raw": line.rstrip("\n")}
+                    continue
+                if isinstance(peer.get("tags"), str):
+                    peer["tags"] = parse_tags(peer["tags"])
+                yield line_num, peer
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def import_peers(url, token, ab_guid, path, fmt=None, reject_file=None,
+                 concurrency=1, rate=None, retries=2):
+    """
+    Add every peer of a CSV/NDJSON file to an address book.
+
+    Rows are streamed and submitted concurrently (see bulk.run_bulk). Rows
+    whose request could not connect are retried; failed rows are written
+    with their error to `reject_file` as NDJSON. Returns (succeeded, failed).
+    """
+    def add(row):
+        _, peer = row
+        if "_error" in peer:
+            raise ValueError(peer["_error"])
+        if not peer.get("id"):
+            raise ValueError("missing id")
+        try:
+            return post_peer(url, token, ab_guid, peer)
+        except OSError as e:
+            if api_client.never_sent(e):
+                raise
+            # The add may have reached the server: sending it again could
+            # duplicate it, so the row is rejected without a retry
+            raise api_client.ApiError(f"Connection failed, peer may have been added: {e}") from e
+
+    succeeded, failures = bulk.run_bulk(
+        add,
+        iter_peer_rows(path, fmt),
+        concurrency=concurrency,
+        rate=rate,
+        label="Import peer",
+        describe=lambda row: f"line {row[0]} ({row[1].get('id')})",
+        retries=retries,
+        # Connection errors that never reached the server only (see add):
+        # api_client already retries transient HTTP errors where that is
+        # safe, and other API errors (e.g. "Peer already exists") or invalid
+        # rows will not go away on retry
+        retry_on=(OSError,),
+        verbose=False,
+    )
+    if reject_file and failures:
+        with open(reject_file, "w", encoding="utf-8") as f:
+            for (line_num, peer), error in sorted(failures, key=lambda failure: failure[0][0]):
+                f.write(json.dumps(dict(peer, _line=line_num, _error=str(error))) + "\n")
+        print(f"Wrote {len(failures)} rejected row(s) to {reject_file}")
+    return succeeded, len(failures)
+
+
+def main(argv=None):
     def parse_color(value):
         """Parse color value - supports both hex (0xFF00FF00) and decimal"""
         if value.startswith('0x') or value.startswith('0X'):
@@ -513,7 +773,8 @@ def main():
         choices=["view-ab", "add-ab", "update-ab", "delete-ab", "get-personal-ab",
                 "view-peer", "add-peer", "update-peer", "delete-peer",
                 "view-tag", "add-tag", "update-tag", "delete-tag",
-                "view-rule", "add-rule", "update-rule", "delete-rule"],
+                "view-rule", "add-rule", "update-rule", "delete-rule", "sync", "import-peers",
+                "add-tags"],
         help="Command to execute",
     )
     
@@ -537,7 +798,7 @@ def main():
     parser.add_argument("--tags", help="Peer tags (supports both 'tag1,tag2' and '[tag1,tag2]' formats, use '[]' to clear tags)")
     
     # Tag management arguments
-    parser.add_argument("--tag-name", help="Tag name")
+    parser.add_argument("--tag-name", help="Tag name (comma separated for add-tags)")
     parser.add_argument("--tag-color", type=parse_color, help="Tag color (hex number like 0xFF00FF00 or decimal, auto-generated if not specified)")
     
     # Rule management arguments
@@ -546,8 +807,21 @@ def main():
     parser.add_argument("--rule-group", help="Rule target group name (auto-sets rule-type=group)")
     parser.add_argument("--rule-permission", type=parse_permission, help="Rule permission (ro=Read, rw=ReadWrite, full=FullControl, or numeric 1/2/3)")
     parser.add_argument("--rule-guid", help="Rule GUID (for update/delete)")
+    
+    # Sync arguments
+    parser.add_argument("--from", dest="from_file", help="Desired state file for sync (YAML or JSON), or peer file for import-peers (CSV or NDJSON, '-' for stdin)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Peer file format for import-peers (default: from the file extension)")
+    parser.add_argument("--reject-file", help="Write rows that failed to import here (NDJSON)")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per import-peers row that could not connect (default: 2)")
+    parser.add_argument("--prune", action="store_true", help="Delete peers and tags not in the desired state (for sync)")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the sync plan")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Max peer IDs per delete request (default: 500)")
+    bulk.add_bulk_arguments(parser)
+
+    api_client.add_client_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    api_client.configure_from_args(args)
 
     # Remove trailing slashes from URL
     while args.url.endswith("/"):
@@ -603,7 +877,7 @@ def main():
                 result = delete_shared_abs(args.url, args.token, ab_guid)
                 print(f"Result: {result}")
     
-    elif args.command in ["view-peer", "add-peer", "update-peer", "delete-peer", "view-tag", "add-tag", "update-tag", "delete-tag", "view-rule", "add-rule", "update-rule", "delete-rule"]:
+    elif args.command in ["view-peer", "add-peer", "update-peer", "delete-peer", "view-tag", "add-tag", "update-tag", "delete-tag", "view-rule", "add-rule", "update-rule", "delete-rule", "sync", "import-peers", "add-tags"]:
         if not args.ab_name and not args.ab_guid:
             print("Error: --ab-name or --ab-guid is required for this command")
             return
@@ -634,17 +908,7 @@ def main():
                 print("Error: --peer-id is required for add-peer command")
                 return
             
-            # Handle tags parsing - support both [tag1,tag2] and tag1,tag2 formats
-            tags = None
-            if args.tags is not None:
-                if args.tags == "[]":
-                    tags = []  # Empty list to clear tags
-                else:
-                    # Remove brackets if present and split by comma
-                    tags_str = args.tags.strip()
-                    if tags_str.startswith('[') and tags_str.endswith(']'):
-                        tags_str = tags_str[1:-1]  # Remove brackets
-                    tags = [tag.strip() for tag in tags_str.split(",") if tag.strip()]
+            tags = parse_tags(args.tags)
             
             result = add_peer(
                 args.url, 
@@ -663,17 +927,7 @@ def main():
                 print("Error: --peer-id is required for update-peer command")
                 return
             
-            # Handle tags parsing - support both [tag1,tag2] and tag1,tag2 formats
-            tags = None
-            if args.tags is not None:
-                if args.tags == "[]":
-                    tags = []  # Empty list to clear tags
-                else:
-                    # Remove brackets if present and split by comma
-                    tags_str = args.tags.strip()
-                    if tags_str.startswith('[') and tags_str.endswith(']'):
-                        tags_str = tags_str[1:-1]  # Remove brackets
-                    tags = [tag.strip() for tag in tags_str.split(",") if tag.strip()]
+            tags = parse_tags(args.tags)
             
             result = update_peer(
                 args.url, 
@@ -707,6 +961,19 @@ def main():
             result = add_tag(args.url, args.token, ab_guid, args.tag_name, args.tag_color)
             print(f"Result: {result}")
         
+        elif args.command == "add-tags":
+            if not args.tag_name:
+                print("Error: --tag-name is required for add-tags command")
+                return
+            
+            tag_names = [x.strip() for x in args.tag_name.split(",") if x.strip()]
+            failed = add_tags(
+                args.url, args.token, ab_guid, tag_names, args.tag_color,
+                args.concurrency, args.rate
+            )
+            if failed:
+                exit(1)
+        
         elif args.command == "update-tag":
             if not args.tag_name:
                 print("Error: --tag-name is required for update-tag command")
@@ -785,6 +1052,32 @@ def main():
             
             result = delete_ab_rules(args.url, args.token, args.rule_guid)
             print(f"Result: {result}")
+        
+        elif args.command == "sync":
+            if not args.from_file:
+                print("Error: --from is required for sync command")
+                return
+            
+            desired = load_peer_file(args.from_file)
+            failures = sync_ab(
+                args.url, args.token, ab_guid, desired,
+                prune=args.prune, dry_run=args.dry_run,
+                concurrency=args.concurrency, rate=args.rate, chunk_size=max(1, args.chunk_size)
+            )
+            if failures:
+                exit(1)
+        
+        elif args.command == "import-peers":
+            if not args.from_file:
+                print("Error: --from is required for import-peers command")
+                return
+            
+            _, failed = import_peers(
+                args.url, args.token, ab_guid, args.from_file, args.format,
+                args.reject_file, args.concurrency, args.rate, args.retries
+            )
+            if failed:
+                exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,636 @@
+#!/usr/bin/env python3
+
+"""
+Shared HTTP client for the console admin scripts (devices.py, users.py, ...).
+
+All requests go through one `requests.Session` with keep-alive connection
+pooling, so paginated listings and bulk actions reuse TCP/TLS connections
+instead of paying a new handshake per call.
+
+Settings can be given on the command line (see `add_client_arguments`) or via
+environment variables:
+    MDESK_POOL_SIZE      max pooled connections per host (default: 10)
+    MDESK_TIMEOUT        request timeout in seconds (default: 30)
+    MDESK_MAX_PAGE_SIZE  largest page size tried by list calls (default: 1000)
+    MDESK_SLOW_PAGE      seconds after which a list page is slow (default: 5)
+    MDESK_RETRIES        retries of a failed request (default: 3)
+
+Failed requests are retried with exponential backoff and jitter: 429 and
+503 responses for any method (honouring Retry-After), connections that
+could not be made for any method, 502/504 responses and other connection
+errors only for idempotent requests (GET/PUT/DELETE, or calls passing
+idempotent=True). Overload responses and runs of consecutive
+failures open a circuit breaker that pauses every worker thread at once,
+so a bulk job backs off together instead of hammering a struggling server.
+
+With --stats (or --stats-json FILE) every request is recorded per endpoint
+(method and path, GUIDs and IDs replaced by {id}): count, errors, latency
+percentiles, bytes and retries, reported when the script exits.
+"""
+
+import atexit
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from itertools import islice
+from urllib.parse import urlsplit
+
+DEFAULT_POOL_SIZE = int(os.getenv("MDESK_POOL_SIZE") or "10")
+DEFAULT_TIMEOUT = float(os.getenv("MDESK_TIMEOUT") or "30")
+MAX_PAGE_SIZE = int(os.getenv("MDESK_MAX_PAGE_SIZE") or "1000")
+MIN_PAGE_SIZE = 10
+SLOW_PAGE_SECONDS = float(os.getenv("MDESK_SLOW_PAGE") or "5")
+DEFAULT_RETRIES = int(os.getenv("MDESK_RETRIES") or "3")
+# Backoff before retry n is random in [0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**n)]
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+# Longest Retry-After that is honoured
+MAX_RETRY_AFTER = 300.0
+OVERLOAD_STATUSES = (429, 503)
+GATEWAY_STATUSES = (502, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+_pool_size = DEFAULT_POOL_SIZE
+_timeout = DEFAULT_TIMEOUT
+_retries = DEFAULT_RETRIES
+_session = None
+# Set by fix_pool_size
+_pool_fixed = False
+# Learned page size per list endpoint URL, see iter_pages
+_page_sizes = {}
+_lock = threading.Lock()
+
+# Request statistics per endpoint, see enable_stats
+_stats = None
+_stats_lock = threading.Lock()
+# Latency histogram buckets grow by 5%, so percentiles are within 5%
+_BUCKET_BASE = math.log(1.05)
+_ID_SEGMENT = re.compile(r"^([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)$")
+
+
+class ApiError(Exception):
+    """Raised for a non-200 response or a response body with an "error" key"""
+
+
+class CircuitBreaker:
+    """
+    Pause shared by all threads. `pause()` (overload responses) and
+    `threshold` consecutive failures make every request wait; the cooldown
+    after consecutive failures doubles up to `max_cooldown` while the
+    server keeps failing and resets on the first success.
+    """
+
+    def __init__(self, threshold=5, cooldown=2.0, max_cooldown=60.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            delay = self.open_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.open_until = max(self.open_until, time.monotonic() + seconds)
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.threshold:
+                return
+            self.failures = 0
+            self.open_until = max(self.open_until, time.monotonic() + self.cooldown)
+            print(
+                f"Warning: server keeps failing, pausing all requests for {self.cooldown:g}s",
+                file=sys.stderr,
+            )
+            self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+
+    def success(self):
+        if self.failures or self.cooldown != self.base_cooldown:
+            with self.lock:
+                self.failures = 0
+                self.cooldown = self.base_cooldown
+
+
+_breaker = CircuitBreaker()
+
+
+def configure(pool_size=None, timeout=None, retries=None):
+    """
+    Change pool size, timeout and/or retries. Timeout and retries apply to
+    the next request; a different pool size replaces the session on next use.
+    """
+    global _pool_size, _timeout, _retries, _session
+    with _lock:
+        if pool_size is not None and not _pool_fixed:
+            pool_size = max(1, pool_size)
+            if pool_size != _pool_size:
+                _pool_size = pool_size
+                if _session is not None:
+                    _session.close()
+                    _session = None
+        if timeout is not None:
+            _timeout = timeout
+        if retries is not None:
+            _retries = max(0, retries)
+
+
+def fix_pool_size(size):
+    """
+    Size the pool once for the rest of the process. Later configure() calls
+    keep the session, so operations running side by side in one process (a
+    batch run) share its connections instead of replacing it under each other.
+    """
+    global _pool_fixed
+    configure(pool_size=size)
+    _pool_fixed = True
+
+
+def ensure_pool_size(size):
+    """Grow the connection pool to at least `size` connections"""
+    if size > _pool_size:
+        configure(pool_size=size)
+
+
+def get_session():
+    """Return the shared session, creating it on first use"""
+    global _session
+    with _lock:
+        if _session is None:
+            # Imported on first use: requests dominates the scripts' start-up time
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=_pool_size, pool_maxsize=_pool_size
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def _send(method, url, kwargs):
+    if _stats is None:
+        return get_session().request(method, url, **kwargs)
+
+    start = time.perf_counter()
+    try:
+        response = get_session().request(method, url, **kwargs)
+    except Exception:
+        _record(method, url, time.perf_counter() - start, None)
+        raise
+    _record(method, url, time.perf_counter() - start, response)
+    return response
+
+
+def retry_delay(attempt):
+    """Exponential backoff with full jitter for retry number `attempt` (0-based)"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def retry_after(response):
+    """Seconds from a Retry-After header (delta or HTTP date), None if absent"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(MAX_RETRY_AFTER, max(0.0, seconds))
+
+
+def never_sent(error):
+    """
+    True for a connection error raised before the request reached the
+    server (a connect timeout or a refused connection), so it is safe to
+    send again even when it is not idempotent.
+    """
+    import requests
+
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        from urllib3.exceptions import NewConnectionError
+
+        return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+def request(method, url, idempotent=None, **kwargs):
+    """
+    Send a request through the shared session with the default timeout,
+    retrying transient failures (see module docstring). `idempotent`
+    overrides the method default for calls that are safe to repeat.
+    After the last retry the final response is returned (or the
+    connection error raised) as without retries.
+    """
+    import requests
+
+    kwargs.setdefault("timeout", _timeout)
+    method = method.upper()
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+
+    attempt = 0
+    while True:
+        _breaker.wait()
+        try:
+            response = _send(method, url, kwargs)
+        except requests.exceptions.RequestException as e:
+            safe = idempotent or never_sent(e)
+            if not isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                raise
+            _breaker.failure()
+            if attempt >= _retries or not safe:
+                raise
+            delay = retry_delay(attempt)
+        else:
+            status = response.status_code
+            if status in OVERLOAD_STATUSES:
+                wait = retry_after(response)
+                delay = wait if wait is not None else retry_delay(attempt)
+                _breaker.pause(delay)
+                _breaker.failure()
+                if attempt >= _retries:
+                    return response
+            elif status in GATEWAY_STATUSES:
+                _breaker.failure()
+                if attempt >= _retries or not idempotent:
+                    return response
+                delay = retry_delay(attempt)
+            else:
+                _breaker.success()
+                return response
+            response.close()
+
+        record_retry(method, url)
+        attempt += 1
+        time.sleep(delay)
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        # bucket index -> count, see _bucket
+        self.histogram = {}
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile, in seconds"""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= rank:
+                return min(self.max_seconds, math.exp((bucket + 1) * _BUCKET_BASE) / 1000)
+        return self.max_seconds
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "total_seconds": round(self.total_seconds, 3),
+            "p50_ms": round(self.percentile(50) * 1000, 1),
+            "p95_ms": round(self.percentile(95) * 1000, 1),
+            "p99_ms": round(self.percentile(99) * 1000, 1),
+            "max_ms": round(self.max_seconds * 1000, 1),
+        }
+
+
+def endpoint_name(method, url):
+    """"GET /api/devices/{id}/enable" for stats: no host, query or IDs"""
+    path = "/".join(
+        "{id}" if _ID_SEGMENT.match(part) else part for part in urlsplit(url).path.split("/")
+    )
+    return f"{method.upper()} {path}"
+
+
+def _bucket(seconds):
+    return int(math.log(max(seconds * 1000, 0.01)) / _BUCKET_BASE)
+
+
+def _endpoint_stats(method, url):
+    name = endpoint_name(method, url)
+    entry = _stats.get(name)
+    if entry is None:
+        entry = _stats[name] = _EndpointStats()
+    return entry
+
+
+def _record(method, url, seconds, response):
+    sent = 0
+    received = 0
+    failed = response is None or response.status_code >= 400
+    if response is not None:
+        body = response.request.body
+        sent = len(body) if body else 0
+        length = response.headers.get("Content-Length")
+        # Wire size when known; the decoded body otherwise
+        received = int(length) if length and length.isdigit() else len(response.content)
+    with _stats_lock:
+        entry = _endpoint_stats(method, url)
+        entry.count += 1
+        entry.errors += failed
+        entry.bytes_sent += sent
+        entry.bytes_received += received
+        entry.total_seconds += seconds
+        entry.max_seconds = max(entry.max_seconds, seconds)
+        bucket = _bucket(seconds)
+        entry.histogram[bucket] = entry.histogram.get(bucket, 0) + 1
+
+
+def record_retry(method, url):
+    """Count a request that is being sent again (retry or smaller page)"""
+    if _stats is None:
+        return
+    with _stats_lock:
+        _endpoint_stats(method, url).retries += 1
+
+
+def enable_stats():
+    """Start recording request statistics"""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = {}
+
+
+def get_stats():
+    """Request statistics per endpoint as plain dicts, busiest first"""
+    with _stats_lock:
+        items = sorted((_stats or {}).items(), key=lambda item: -item[1].total_seconds)
+        return {name: entry.as_dict() for name, entry in items}
+
+
+def print_stats(stream=None):
+    """Print the request statistics as a table"""
+    stream = stream or sys.stderr
+    stats = get_stats()
+    if not stats:
+        print("No requests", file=stream)
+        return
+    width = max(len(name) for name in stats)
+    print(
+        f"{'endpoint':<{width}} {'count':>7} {'errors':>6} {'retries':>7} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'total s':>8} {'KB in':>9}",
+        file=stream,
+    )
+    for name, entry in stats.items():
+        print(
+            f"{name:<{width}} {entry['count']:>7} {entry['errors']:>6} {entry['retries']:>7} "
+            f"{entry['p50_ms']:>8} {entry['p95_ms']:>8} {entry['p99_ms']:>8} {entry['max_ms']:>8} "
+            f"{entry['total_seconds']:>8.2f} {entry['bytes_received'] / 1024:>9.1f}",
+            file=stream,
+        )
+
+
+def write_stats(path):
+    """Write the request statistics as JSON"""
+    with open(path, "w") as f:
+        json.dump(get_stats(), f, indent=2)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request("PATCH", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
+
+
+def parse_response(response):
+    """Return the JSON body (or text) of a response, raise ApiError on error"""
+    if response.status_code != 200:
+        raise ApiError(f"HTTP {response.status_code} - {response.text}")
+
+    try:
+        response_json = response.json()
+    except ValueError:
+        return response.text or "Success"
+    if isinstance(response_json, dict) and "error" in response_json:
+        raise ApiError(response_json["error"])
+    return response_json
+
+
+def check_page(response):
+    """Return the JSON body of a list page response, exit on error"""
+    if response.status_code != 200:
+        print(f"Error: HTTP {response.status_code} - {response.text}")
+        exit(1)
+
+    response_json = response.json()
+    if "error" in response_json:
+        print(f"Error: {response_json['error']}")
+        exit(1)
+    return response_json
+
+
+def get_page(url, headers, params, current):
+    """Fetch one page of a paginated list endpoint, exit on error"""
+    page_params = dict(params, current=current)
+    return check_page(get(url, headers=headers, params=page_params))
+
+
+def learned_page_size(url):
+    """Page size to start with for a list endpoint, see iter_pages"""
+    return _page_sizes.get(url, MAX_PAGE_SIZE)
+
+
+def remember_page_size(url, page_size):
+    _page_sizes[url] = page_size
+
+
+def is_page_size_error(response):
+    """Errors worth retrying with a smaller page instead of giving up"""
+    return response.status_code in (400, 413, 414, 422) or response.status_code >= 500
+
+
+def _fetch_at(url, headers, params, page_size, offset, adaptive):
+    """
+    Fetch the page that starts at row `offset`, shrinking the page size on
+    errors or server-side caps when adaptive.
+
+    Returns (rows from offset on, full page length, total, page size, seconds).
+    """
+    while True:
+        current, skip = offset // page_size + 1, offset % page_size
+        page_params = dict(params, pageSize=page_size, current=current)
+        start = time.monotonic()
+        response = get(url, headers=headers, params=page_params)
+        elapsed = time.monotonic() - start
+        if adaptive and page_size > MIN_PAGE_SIZE and is_page_size_error(response):
+            page_size = max(MIN_PAGE_SIZE, page_size // 2)
+            record_retry("GET", url)
+            continue
+
+        response_json = check_page(response)
+        data = response_json.get("data", [])
+        total = response_json.get("total", 0)
+        if adaptive and data and len(data) < page_size and offset + len(data) - skip < total:
+            # Short page with more rows left: the server caps the page size
+            capped = len(data)
+            page_size = capped
+            if current == 1:
+                return data[skip:], capped, total, page_size, elapsed
+            continue
+        return data[skip:], len(data), total, page_size, elapsed
+
+
+def iter_pages(url, headers, params, page_size=None, parallel=1):
+    """
+    Yield all rows of a paginated list endpoint (`current`/`pageSize` params,
+    `data`/`total` in the response) as pages arrive.
+
+    With page_size=None the page size is adaptive: the first request asks for
+    MDESK_MAX_PAGE_SIZE rows, then the size follows the largest page the
+    server actually returns, halves on errors or on pages slower than
+    MDESK_SLOW_PAGE seconds, and is remembered per endpoint for later calls.
+
+    The first page is fetched alone to learn `total`; with parallel > 1 the
+    remaining pages are then fetched concurrently by at most `parallel`
+    workers and yielded in page order. Only a small window of pages is in
+    flight at a time, so memory stays flat however long the listing is.
+    """
+    adaptive = page_size is None
+    if adaptive:
+        page_size = learned_page_size(url)
+
+    data, length, total, page_size, elapsed = _fetch_at(
+        url, headers, params, page_size, 0, adaptive
+    )
+    if adaptive:
+        remember_page_size(url, page_size)
+    yield from data
+    if length < page_size or page_size >= total:
+        return
+
+    if parallel <= 1:
+        offset = length
+        while True:
+            if adaptive and elapsed > SLOW_PAGE_SECONDS and page_size > MIN_PAGE_SIZE:
+                page_size = max(MIN_PAGE_SIZE, page_size // 2)
+            data, length, total, page_size, elapsed = _fetch_at(
+                url, headers, params, page_size, offset, adaptive
+            )
+            if adaptive:
+                remember_page_size(url, page_size)
+            yield from data
+            offset += len(data)
+            if length < page_size or offset >= total:
+                break
+        return
+
+    params = dict(params, pageSize=page_size)
+    last_page = (total + page_size - 1) // page_size
+    pages = iter(range(2, last_page + 1))
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        try:
+            for current in islice(pages, parallel * 2):
+                pending.append(executor.submit(get_page, url, headers, params, current))
+            while pending:
+                response_json = pending.popleft().result()
+                for current in islice(pages, 1):
+                    pending.append(executor.submit(get_page, url, headers, params, current))
+                yield from response_json.get("data", [])
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def fetch_pages(url, headers, params, page_size=None, parallel=1):
+    """Fetch all rows of a paginated list endpoint, see `iter_pages`"""
+    return list(iter_pages(url, headers, params, page_size, parallel))
+
+
+def add_client_arguments(parser):
+    """Add the shared connection options to an argparse parser"""
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=DEFAULT_POOL_SIZE,
+        help=f"Max pooled HTTP connections (default: {DEFAULT_POOL_SIZE}, env MDESK_POOL_SIZE)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=f"HTTP request timeout in seconds (default: {DEFAULT_TIMEOUT:g}, env MDESK_TIMEOUT)",
+    )
+    parser.add_argument(
+        "--request-retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help=f"Retries of a failed HTTP request, 0 to disable (default: {DEFAULT_RETRIES}, env MDESK_RETRIES)",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print per-endpoint request counts, latency percentiles and bytes to stderr on exit",
+    )
+    parser.add_argument(
+        "--stats-json", metavar="FILE", help="Write the request statistics to FILE as JSON on exit"
+    )
+
+
+def configure_from_args(args):
+    """Apply the options added by `add_client_arguments`"""
+    pool_size = args.pool_size
+    # Parallel workers each need their own pooled connection
+    for name in ("parallel", "concurrency"):
+        workers = getattr(args, name, None)
+        if workers:
+            pool_size = max(pool_size, workers)
+    configure(pool_size=pool_size, timeout=args.timeout, retries=args.request_retries)
+
+    if getattr(args, "stats", False) or getattr(args, "stats_json", None):
+        enable_stats()
+        # Runs on normal exit and on exit(1) after an error alike
+        if args.stats:
+            atexit.register(print_stats)
+        if args.stats_json:
+            atexit.register(write_stats, args.stats_json)
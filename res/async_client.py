@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+"""
+asyncio client for the console API, for automation that combines listings
+with many follow-up calls.
+
+It exposes the operations of devices.py, users.py and ab.py as coroutines.
+Calls go through the shared pooled session of api_client on a private thread
+pool, so no extra HTTP dependency is needed; a semaphore bounds the number of
+requests in flight. Errors raise api_client.ApiError instead of exiting.
+
+The client is a library for asyncio programs. The CLI scripts do not use
+it: their bulk commands already run calls concurrently on the same pooled
+session through bulk.run_bulk, which also brings rate limiting and
+progress, so an event loop there would not save a request.
+
+    async with AsyncConsoleClient(url, token, concurrency=16) as client:
+        devices = await client.view_devices(device_group_name="lab")
+        results = await client.map(
+            lambda d: client.disable_device(d["guid"]), devices
+        )
+
+From synchronous code:
+
+    devices = run(url, token, lambda client: client.view_devices())
+
+Cancelling the awaiting task cancels the requests that have not started
+yet; requests already on the wire finish and their results are dropped.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import api_client
+
+
+def _wildcard(params, exact=()):
+    """Same fuzzy matching the CLI scripts apply to string filters"""
+    return {
+        k: "%" + v + "%" if (k not in exact and v != "-" and "%" not in v) else v
+        for k, v in params.items()
+        if v is not None
+    }
+
+
+class AsyncConsoleClient:
+    def __init__(self, url, token, concurrency=8):
+        while url.endswith("/"):
+            url = url[:-1]
+        self.url = url
+        self.token = token
+        self.concurrency = max(1, concurrency)
+        self._semaphore = None
+        self._executor = None
+
+    async def __aenter__(self):
+        self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def open(self):
+        if self._executor is None:
+            api_client.ensure_pool_size(self.concurrency)
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+    async def _send(self, method, path, **kwargs):
+        self.open()
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor,
+                partial(
+                    api_client.request, method, f"{self.url}{path}",
+                    headers=self.headers, **kwargs
+                ),
+            )
+
+    async def request(self, method, path, **kwargs):
+        """Send one request, return the parsed body, raise ApiError on error"""
+        return api_client.parse_response(await self._send(method, path, **kwargs))
+
+    async def _page_at(self, path, params, page_size, offset, adaptive):
+        """
+        Fetch the page holding row `offset`, halving the page size on errors
+        like api_client.iter_pages when adaptive.
+        Returns (body, rows from offset on, page size).
+        """
+        while True:
+            current, skip = offset // page_size + 1, offset % page_size
+            response = await self._send(
+                "GET", path, params=dict(params, pageSize=page_size, current=current)
+            )
+            if (adaptive and page_size > api_client.MIN_PAGE_SIZE
+                    and api_client.is_page_size_error(response)):
+                page_size = max(api_client.MIN_PAGE_SIZE, page_size // 2)
+                api_client.record_retry("GET", f"{self.url}{path}")
+                continue
+            body = api_client.parse_response(response)
+            return body, body.get("data", [])[skip:], page_size
+
+    async def _range(self, path, params, page_size, start, end, adaptive):
+        """Rows start..end, one request unless the page size has to shrink"""
+        rows = []
+        while start < end:
+            _, data, page_size = await self._page_at(path, params, page_size, start, adaptive)
+            data = data[:end - start]
+            if not data:
+                break
+            rows.extend(data)
+            start += len(data)
+        return rows
+
+    async def list(self, path, params=None, page_size=None):
+        """
+        Fetch all rows of a paginated list endpoint. The first page learns
+        the total and the server's page size cap, then the remaining pages
+        are fetched concurrently and returned in order. With page_size=None
+        a page that fails is fetched again in smaller pages.
+        """
+        params = dict(params or {})
+        adaptive = page_size is None
+        if adaptive:
+            page_size = api_client.learned_page_size(f"{self.url}{path}")
+        first, rows, page_size = await self._page_at(path, params, page_size, 0, adaptive)
+        rows = list(rows)
+        total = first.get("total", 0)
+        if len(rows) >= total:
+            return rows
+        if len(rows) < page_size:
+            if not rows:
+                return rows
+            # Server caps the page size
+            page_size = len(rows)
+        if adaptive:
+            api_client.remember_page_size(f"{self.url}{path}", page_size)
+
+        pages = await asyncio.gather(*(
+            self._range(path, params, page_size, start, min(start + page_size, total), adaptive)
+            for start in range(page_size, total, page_size)
+        ))
+        for page in pages:
+            rows.extend(page)
+        return rows
+
+    async def map(self, func, items, return_exceptions=True):
+        """
+        Await `func(item)` for every item, at most `concurrency` at a time
+        (enforced per request). With return_exceptions the result list holds
+        the exception for items that failed.
+        """
+        return await asyncio.gather(
+            *(func(item) for item in items), return_exceptions=return_exceptions
+        )
+
+    # ---------- Devices (devices.py) ----------
+
+    async def view_devices(self, id=None, device_name=None, user_name=None,
+                           group_name=None, device_group_name=None):
+        params = _wildcard({
+            "id": id,
+            "device_name": device_name,
+            "user_name": user_name,
+            "group_name": group_name,
+            "device_group_name": device_group_name,
+        })
+        return await self.list("/api/devices", params)
+
+    async def enable_device(self, guid):
+        return await self.request("POST", f"/api/devices/{guid}/enable", idempotent=True)
+
+    async def disable_device(self, guid):
+        return await self.request("POST", f"/api/devices/{guid}/disable", idempotent=True)
+
+    async def delete_device(self, guid):
+        return await self.request("DELETE", f"/api/devices/{guid}")
+
+    async def assign_device(self, guid, type, value):
+        return await self.request(
+            "POST", f"/api/devices/{guid}/assign", json={"type": type, "value": value},
+            idempotent=True,
+        )
+
+    # ---------- Users (users.py) ----------
+
+    async def view_users(self, name=None, group_name=None):
+        params = _wildcard({"name": name, "group_name": group_name})
+        return await self.list("/api/users", params)
+
+    async def enable_user(self, guid):
+        return await self.request("POST", f"/api/users/{guid}/enable", idempotent=True)
+
+    async def disable_user(self, guid):
+        return await self.request("POST", f"/api/users/{guid}/disable", idempotent=True)
+
+    async def delete_user(self, guid):
+        return await self.request("DELETE", f"/api/users/{guid}")
+
+    async def new_user(self, name, password, group_name=None, email=None, note=None):
+        payload = {"name": name, "password": password}
+        if group_name:
+            payload["group_name"] = group_name
+        if email:
+            payload["email"] = email
+        if note:
+            payload["note"] = note
+        return await self.request("POST", "/api/users", json=payload)
+
+    async def invite_user(self, email, name, group_name=None, note=None):
+        payload = {"email": email, "name": name}
+        if group_name:
+            payload["group_name"] = group_name
+        if note:
+            payload["note"] = note
+        return await self.request("POST", "/api/users/invite", json=payload)
+
+    async def force_logout(self, user_guids):
+        return await self.request(
+            "POST", "/api/users/force-logout", json={"user_guids": list(user_guids)}
+        )
+
+    # ---------- Address books (ab.py) ----------
+
+    async def get_personal_ab(self):
+        return await self.request("GET", "/api/ab/personal")
+
+    async def view_shared_abs(self, name=None):
+        params = _wildcard({"name": name}, exact=("name",))
+        return await self.list("/api/ab/shared/profiles", params)
+
+    async def get_ab_by_name(self, ab_name):
+        for ab in await self.view_shared_abs(ab_name):
+            if ab["name"] == ab_name:
+                return ab
+        return None
+
+    async def view_ab_peers(self, ab_guid, peer_id=None, alias=None):
+        params = _wildcard({"ab": ab_guid, "id": peer_id, "alias": alias}, exact=("ab",))
+        return await self.list("/api/ab/peers", params)
+
+    async def view_ab_tags(self, ab_guid):
+        return await self.request("GET", f"/api/ab/tags/{ab_guid}") or []
+
+    async def add_peer(self, ab_guid, peer_id, alias=None, note=None, tags=None, password=None):
+        payload = {"id": peer_id, "note": note}
+        if alias:
+            payload["alias"] = alias
+        if tags:
+            payload["tags"] = tags if isinstance(tags, list) else [tags]
+        if password:
+            payload["password"] = password
+        return await self.request("POST", f"/api/ab/peer/add/{ab_guid}", json=payload)
+
+    async def update_peer(self, ab_guid, peer_id, alias=None, note=None, tags=None, password=None):
+        payload = {"id": peer_id}
+        if alias is not None:
+            payload["alias"] = alias
+        if tags is not None:
+            payload["tags"] = tags if isinstance(tags, list) else [tags]
+        if password is not None:
+            payload["password"] = password
+        if note is not None:
+            payload["note"] = note
+        return await self.request("PUT", f"/api/ab/peer/update/{ab_guid}", json=payload)
+
+    async def delete_peers(self, ab_guid, peer_ids):
+        if isinstance(peer_ids, str):
+            peer_ids = [peer_ids]
+        return await self.request("DELETE", f"/api/ab/peer/{ab_guid}", json=list(peer_ids))
+
+    async def add_tag(self, ab_guid, tag_name, color):
+        return await self.request(
+            "POST", f"/api/ab/tag/add/{ab_guid}", json={"name": tag_name, "color": color}
+        )
+
+    async def delete_tags(self, ab_guid, tag_names):
+        if isinstance(tag_names, str):
+            tag_names = [tag_names]
+        return await self.request("DELETE", f"/api/ab/tag/{ab_guid}", json=list(tag_names))
+
+
+def run(url, token, func, concurrency=8):
+    """Run `func(client)` (a coroutine function) to completion from sync code"""
+    async def main():
+        async with AsyncConsoleClient(url, token, concurrency) as client:
+            return await func(client)
+
+    return asyncio.run(main())
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+"""
+Local SQLite archive of console audits for offline investigation.
+
+audits.py archive copies audits from the API into the archive and only
+fetches what is newer than the latest archived audit of each type on later
+runs. audits.py query then answers filters and group-by counts from the
+indexed archive instead of LIKE queries against the console.
+
+The archive lives next to the inventory cache (audits.sqlite3 under
+$MDESK_CACHE_DIR, $XDG_CACHE_HOME/mdesk or ~/.cache/mdesk) unless a path is
+given. Rows are stored as returned by the API, keyed by audit type and
+audit id, so a row fetched again replaces the archived one; the commonly
+filtered fields are copied into indexed columns.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+import inventory_cache
+
+# Indexed columns that can be filtered and grouped on, besides created_at
+COLUMNS = ["audit_type", "remote", "device", "operator", "conn_type", "typ"]
+
+# Group-by keys computed from created_at (local time)
+TIME_GROUPS = {
+    "hour": "%Y-%m-%d %H:00",
+    "day": "%Y-%m-%d",
+    "month": "%Y-%m",
+}
+
+# Connections archived without an end_time are fetched again on later runs
+# to pick it up, unless they started this long before the newest audit
+REFRESH_WINDOW = 7 * 86400
+
+
+def default_path():
+    return os.path.join(os.path.dirname(inventory_cache.default_path()), "audits.sqlite3")
+
+
+def created_ts(value):
+    """created_at of an audit row as Unix seconds (float), None if missing"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def row_digest(row):
+    """Hash of an audit row's content, for de-duplication"""
+    return hashlib.sha1(json.dumps(row, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def row_key(row):
+    """Archive key of an audit row: its id, or its content hash if it has none"""
+    if row.get("id") is not None:
+        return str(row["id"])
+    return row_digest(row)
+
+
+class Archive:
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # digest holds row_key(): the audit id, or a content hash without one
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS audits ("
+            " audit_type TEXT NOT NULL, digest TEXT NOT NULL, created_at REAL,"
+            " remote TEXT, device TEXT, operator TEXT, conn_type INTEGER, typ INTEGER,"
+            " data TEXT NOT NULL, PRIMARY KEY (audit_type, digest));"
+            "CREATE INDEX IF NOT EXISTS audits_type_created ON audits (audit_type, created_at);"
+            "CREATE INDEX IF NOT EXISTS audits_created ON audits (created_at);"
+            "CREATE INDEX IF NOT EXISTS audits_remote ON audits (remote, created_at);"
+            "CREATE INDEX IF NOT EXISTS audits_device ON audits (device, created_at);"
+            "CREATE INDEX IF NOT EXISTS audits_operator ON audits (operator, created_at);"
+            "CREATE INDEX IF NOT EXISTS audits_conn_type ON audits (conn_type, created_at);"
+            "CREATE INDEX IF NOT EXISTS audits_typ ON audits (typ, created_at);"
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def store(self, audit_type, rows):
+        """
+        Insert raw API rows; a row with the id of an archived one replaces it.
+        Returns the number of rows added or changed.
+        """
+        values = [
+            (
+                audit_type,
+                row_key(row),
+                created_ts(row.get("created_at")),
+                row.get("remote"),
+                row.get("device"),
+                row.get("operator"),
+                row.get("conn_type"),
+                row.get("typ"),
+                json.dumps(row, ensure_ascii=False),
+            )
+            for row in rows
+        ]
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT INTO audits (audit_type, digest, created_at, remote,"
+                " device, operator, conn_type, typ, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (audit_type, digest) DO UPDATE SET created_at=excluded.created_at,"
+                " remote=excluded.remote, device=excluded.device, operator=excluded.operator,"
+                " conn_type=excluded.conn_type, typ=excluded.typ, data=excluded.data"
+                " WHERE data != excluded.data",
+                values,
+            )
+            return self.conn.total_changes - before
+
+    def latest(self, audit_type):
+        """created_at of the newest archived audit of a type, None if there is none"""
+        return self.conn.execute(
+            "SELECT MAX(created_at) FROM audits WHERE audit_type=?", (audit_type,)
+        ).fetchone()[0]
+
+    def refresh_from(self, audit_type, window=REFRESH_WINDOW):
+        """
+        created_at to fetch a type from on an incremental run: the newest
+        archived audit, or the oldest connection still without an end_time
+        if that is earlier (but at most `window` seconds earlier). None if
+        nothing is archived.
+        """
+        latest = self.latest(audit_type)
+        if latest is None or audit_type != "conn":
+            return latest
+        oldest_open = self.conn.execute(
+            "SELECT MIN(created_at) FROM audits WHERE audit_type=? AND created_at >= ?"
+            " AND COALESCE(json_extract(data, '$.end_time'), 0) IN (0, '')",
+            (audit_type, latest - window),
+        ).fetchone()[0]
+        return latest if oldest_open is None else min(latest, oldest_open)
+
+    def _where(self, filters, since=None, until=None):
+        clauses, values = [], []
+        for column, value in (filters or {}).items():
+            if value is None:
+                continue
+            if column not in COLUMNS:
+                raise ValueError(f"Unknown archive column '{column}'")
+            if isinstance(value, str) and "%" in value:
+                clauses.append(f"{column} LIKE ?")
+            else:
+                clauses.append(f"{column} = ?")
+            values.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            values.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            values.append(until)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return where, values
+
+    def rows(self, filters=None, since=None, until=None, limit=None):
+        """Yield (audit type, raw row) matching the filters, oldest first"""
+        where, values = self._where(filters, since, until)
+        sql = f"SELECT audit_type, data FROM audits{where} ORDER BY created_at"
+        if limit:
+            sql += " LIMIT ?"
+            values.append(limit)
+        for audit_type, data in self.conn.execute(sql, values):
+            yield audit_type, json.loads(data)
+
+    def group(self, group_by, filters=None, since=None, until=None, limit=None):
+        """
+        Count matching audits per value of the `group_by` keys (columns or
+        TIME_GROUPS). Returns dicts with the keys, count, first and last
+        created_at, largest groups first.
+        """
+        expressions = []
+        for key in group_by:
+            if key in TIME_GROUPS:
+                expressions.append(
+                    f"strftime('{TIME_GROUPS[key]}', created_at, 'unixepoch', 'localtime')"
+                )
+            elif key in COLUMNS:
+                expressions.append(key)
+            else:
+                raise ValueError(f"Cannot group by '{key}'")
+        where, values = self._where(filters, since, until)
+        keys = ", ".join(expressions)
+        sql = (
+            f"SELECT {keys}, COUNT(*), MIN(created_at), MAX(created_at) FROM audits{where}"
+            f" GROUP BY {keys} ORDER BY COUNT(*) DESC"
+        )
+        if limit:
+            sql += " LIMIT ?"
+            values.append(limit)
+        n = len(group_by)
+        return [
+            dict(zip(group_by, row[:n]), count=row[n], first=row[n + 1], last=row[n + 2])
+            for row in self.conn.execute(sql, values)
+        ]
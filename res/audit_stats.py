@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+"""
+Single-pass audit statistics for audits.py stats.
+
+`AuditStats.add()` takes one audit row at a time (raw API rows or rows
+decorated by export/follow) and keeps only counters: exact counts for
+small domains (audit types, connection types, alarm types, hours) and
+space-saving heavy-hitter sketches for peers and operators, so memory stays
+bounded however many rows go through.
+"""
+
+import csv
+import gzip
+import heapq
+import io
+import json
+import sys
+from datetime import datetime
+
+# Entries kept by each heavy-hitter sketch; the top results are exact as
+# long as they are clearly above the rest
+HEAVY_HITTERS = 200
+
+
+class SpaceSaving:
+    """
+    Approximate top-k counter in fixed memory (Metwally et al.). A key that
+    is not tracked replaces the smallest entry and inherits its count as
+    the error bound, so reported counts are overestimates by at most
+    `error`.
+    """
+
+    def __init__(self, capacity=HEAVY_HITTERS):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        # (count, key) entries, possibly stale; fixed lazily when evicting
+        self.heap = []
+
+    def add(self, key, weight=1):
+        if key in self.counts:
+            self.counts[key] += weight
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[key] = weight
+            self.errors[key] = 0
+            heapq.heappush(self.heap, (weight, key))
+            return
+        while True:
+            count, victim = heapq.heappop(self.heap)
+            current = self.counts.get(victim)
+            if current == count:
+                break
+            if current is not None:
+                heapq.heappush(self.heap, (current, victim))
+        del self.counts[victim]
+        del self.errors[victim]
+        self.counts[key] = count + weight
+        self.errors[key] = count
+        heapq.heappush(self.heap, (count + weight, key))
+
+    def top(self, n):
+        items = sorted(self.counts.items(), key=lambda item: -item[1])[:n]
+        return [{"key": key, "count": count, "error": self.errors[key]} for key, count in items]
+
+
+def _type_name(value, name):
+    """Raw type codes go through `name`; decorated rows already carry the name"""
+    if value is None or value == "":
+        return "Unknown"
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, int) and name is not None:
+        return name(value)
+    return value
+
+
+def _hour(value):
+    """Local "YYYY-MM-DD HH:00" bucket of a Unix or formatted timestamp"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return value[:13].replace("T", " ") + ":00"
+    return datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:00")
+
+
+def file_bytes(row):
+    """Bytes moved by a file audit: the sizes in info.files, else "size" """
+    info = row.get("info")
+    if isinstance(info, str):
+        try:
+            info = json.loads(info)
+        except ValueError:
+            info = None
+    if isinstance(info, dict) and isinstance(info.get("files"), list):
+        total = 0
+        for entry in info["files"]:
+            size = entry[1] if isinstance(entry, list) and len(entry) > 1 else None
+            if isinstance(entry, dict):
+                size = entry.get("size")
+            if isinstance(size, (int, float)):
+                total += size
+        return total
+    size = row.get("size")
+    return size if isinstance(size, (int, float)) else 0
+
+
+class AuditStats:
+    """
+    `conn_type_name` and `alarm_type_name` turn raw type codes into the
+    readable names used by decorated rows, so both kinds count alike.
+    """
+
+    def __init__(self, capacity=HEAVY_HITTERS, conn_type_name=None, alarm_type_name=None):
+        self.conn_type_name = conn_type_name
+        self.alarm_type_name = alarm_type_name
+        self.rows = 0
+        self.per_type = {}
+        self.per_hour = {}
+        self.conn_types = {}
+        self.conn_peers = SpaceSaving(capacity)
+        self.file_transfers = 0
+        self.file_bytes = 0
+        self.file_peers = SpaceSaving(capacity)
+        self.alarm_types = {}
+        self.alarm_devices = SpaceSaving(capacity)
+        self.operators = SpaceSaving(capacity)
+
+    def add(self, row, audit_type):
+        """Count one audit; `row["audit_type"]`, if set, wins over audit_type"""
+        audit_type = row.get("audit_type") or audit_type
+        self.rows += 1
+        self.per_type[audit_type] = self.per_type.get(audit_type, 0) + 1
+        hour = _hour(row.get("created_at"))
+        if hour is not None:
+            self.per_hour[hour] = self.per_hour.get(hour, 0) + 1
+
+        if audit_type == "conn":
+            conn_type = row.get("conn_type")
+            name = "Not Logged In" if conn_type in (None, "") else _type_name(conn_type, self.conn_type_name)
+            self.conn_types[name] = self.conn_types.get(name, 0) + 1
+            if row.get("remote"):
+                self.conn_peers.add(row["remote"])
+        elif audit_type == "file":
+            size = file_bytes(row)
+            self.file_transfers += 1
+            self.file_bytes += size
+            if row.get("remote"):
+                self.file_peers.add(row["remote"], size)
+        elif audit_type == "alarm":
+            name = _type_name(row.get("typ", row.get("type")), self.alarm_type_name)
+            self.alarm_types[name] = self.alarm_types.get(name, 0) + 1
+            if row.get("device"):
+                self.alarm_devices.add(row["device"])
+        elif audit_type == "console":
+            if row.get("operator"):
+                self.operators.add(row["operator"])
+
+    def report(self, top=20):
+        return {
+            "rows": self.rows,
+            "per_type": self.per_type,
+            "per_hour": dict(sorted(self.per_hour.items())),
+            "conn": {
+                "per_conn_type": self.conn_types,
+                "top_peers": self.conn_peers.top(top),
+            },
+            "file": {
+                "transfers": self.file_transfers,
+                "bytes": self.file_bytes,
+                "top_peers_by_bytes": self.file_peers.top(top),
+            },
+            "alarm": {
+                "per_alarm_type": self.alarm_types,
+                "top_devices": self.alarm_devices.top(top),
+            },
+            "console": {
+                "top_operators": self.operators.top(top),
+            },
+        }
+
+
+def iter_export_file(path):
+    """
+    Yield the rows of an export or follow output file: NDJSON or CSV
+    (by extension), optionally gzip-compressed, "-" for stdin.
+    """
+    name = path[:-3] if path.endswith(".gz") else path
+    if path == "-":
+        stream = sys.stdin
+    elif path.endswith(".gz"):
+        stream = io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", newline="")
+    else:
+        stream = open(path, encoding="utf-8", newline="")
+    try:
+        if name.endswith(".csv"):
+            for row in csv.DictReader(stream):
+                yield row
+        else:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
@@ -1,9 +1,22 @@
 #!/usr/bin/env python3
 
-import requests
 import argparse
+import csv
+import gzip
+import io
 import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+import api_client
+import audit_archive
+import audit_stats
+import inventory_cache
 
 
 def format_timestamp(timestamp):
@@ -163,21 +176,9 @@ def check_response(response):
         return response.text or "Success"
 
 
-def view_audits_common(url, token, endpoint, filters=None, page_size=None, current=None, 
-                       created_at=None, days_ago=None, non_wildcard_fields=None):
-    """Common function for viewing audits"""
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    # Set default page size and current page
-    if page_size is None:
-        page_size = 10
-    if current is None:
-        current = 1
-    
-    params = {
-        "pageSize": page_size,
-        "current": current
-    }
+def build_audit_params(filters=None, created_at=None, days_ago=None, non_wildcard_fields=None):
+    """Build the filter query parameters shared by all audit list calls"""
+    params = {}
     
     # Add filter parameters if provided
     if filters:
@@ -207,7 +208,7 @@ def view_audits_common(url, token, endpoint, filters=None, page_size=None, curre
         non_wildcard_fields = set()
     
     # Always exclude these fields from wildcard treatment
-    non_wildcard_fields.update(["created_at", "pageSize", "current"])
+    non_wildcard_fields = set(non_wildcard_fields) | {"created_at", "pageSize", "current"}
     
     string_params = {}
     for k, v in params.items():
@@ -218,8 +219,24 @@ def view_audits_common(url, token, endpoint, filters=None, page_size=None, curre
                 string_params[k] = v
         else:
             string_params[k] = v
+    return string_params
+
 
-    response = requests.get(f"{url}/api/audits/{endpoint}", headers=headers, params=string_params)
+def view_audits_common(url, token, endpoint, filters=None, page_size=None, current=None, 
+                       created_at=None, days_ago=None, non_wildcard_fields=None):
+    """Common function for viewing audits"""
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    # Set default page size and current page
+    if page_size is None:
+        page_size = 10
+    if current is None:
+        current = 1
+    
+    params = build_audit_params(filters, created_at, days_ago, non_wildcard_fields)
+    params.update({"pageSize": page_size, "current": current})
+
+    response = api_client.get(f"{url}/api/audits/{endpoint}", headers=headers, params=params)
     response_json = check_response(response)
     
     # Enhance the data with readable formats
@@ -286,18 +303,683 @@ def view_console_audits(url, token, operator=None,
     )
 
 
-def main():
+AUDIT_TYPES = ["conn", "file", "alarm", "console"]
+
+# Rows per request for export; the server may cap it lower
+EXPORT_PAGE_SIZE = 1000
+# Pages written between two checkpoints
+CHECKPOINT_EVERY = 10
+
+
+def audit_filters(audit_type, remote=None, conn_type=None, device=None, operator=None):
+    """Return (filters, non-wildcard fields) supported by an audit type"""
+    if audit_type == "conn":
+        return {"remote": remote, "conn_type": conn_type}, {"conn_type"}
+    if audit_type == "file":
+        return {"remote": remote}, set()
+    if audit_type == "alarm":
+        return {"device": device}, set()
+    return {"operator": operator}, set()
+
+
+def server_page_size(body, page_size):
+    """
+    The page size the server actually uses, given the response to page 1: the
+    length of that page when it came back short although more rows follow it
+    (the server caps pageSize).
+    """
+    rows = body.get("data", [])
+    if rows and len(rows) < page_size and len(rows) < body.get("total", 0):
+        return len(rows)
+    return page_size
+
+
+def iter_audit_pages(url, token, audit_type, params, page_size, start_page=1,
+                     parallel=4, first=None, get_page=api_client.get_page):
+    """
+    Yield (page number, rows) for all pages of an audit list from
+    `start_page` on, in page order. `first` is the already fetched response of
+    `start_page`, if any.
+
+    The page count is taken from `total` of the first response; the pages
+    after it are fetched by `parallel` workers with a small window in flight.
+    Audits created during the listing push older rows further back, so
+    fetching continues one page at a time while the last page is still full.
+    Pages are fetched with `get_page` (api_client.get_page exits on errors).
+
+    When the server caps the page size below `page_size`, a listing from
+    page 1 continues in pages of the capped size (see server_page_size);
+    page numbers then count pages of that size.
+    """
+    endpoint = f"{url}/api/audits/{audit_type}"
+    headers = {"Authorization": f"Bearer {token}"}
+    params = dict(params, pageSize=page_size)
+    if first is None:
+        first = get_page(endpoint, headers, params, start_page)
+    rows = first.get("data", [])
+    if start_page == 1:
+        page_size = server_page_size(first, page_size)
+        params["pageSize"] = page_size
+    yield start_page, rows
+    if len(rows) < page_size:
+        return
+
+    last_page = (first.get("total", 0) + page_size - 1) // page_size
+    pages = iter(range(start_page + 1, last_page + 1))
+    pending = deque()
+    current = start_page
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        try:
+            for page in islice(pages, parallel * 2):
+                pending.append((page, executor.submit(get_page, endpoint, headers, params, page)))
+            while pending:
+                current, future = pending.popleft()
+                for page in islice(pages, 1):
+                    pending.append((page, executor.submit(get_page, endpoint, headers, params, page)))
+                rows = future.result().get("data", [])
+                yield current, rows
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    while len(rows) >= page_size:
+        current += 1
+        rows = get_page(endpoint, headers, params, current).get("data", [])
+        if rows:
+            yield current, rows
+
+
+def _utc_filter_string(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def parse_duration(value):
+    """"90s", "30m", "6h", "1d", "2w" (or plain seconds) -> seconds"""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def split_windows(start, end, window):
+    """Split [start, end) (Unix seconds) into consecutive windows"""
+    windows = []
+    while start < end:
+        windows.append((start, min(end, start + window)))
+        start += window
+    return windows
+
+
+def fetch_window(url, token, audit_type, params, start, end, page_size=EXPORT_PAGE_SIZE,
+                 until_param=None):
+    """
+    Return the audits with start <= created_at < end, oldest first.
+
+    The list endpoints take `created_at` as a lower bound only. Paging
+    stops once a page of an oldest-first listing reaches `end`, so a window
+    only reads its own rows. A server that lists newest first needs an upper
+    bound parameter (`until_param`) to keep windows shallow. A capped page
+    size is followed like in iter_audit_pages.
+    """
+    endpoint = f"{url}/api/audits/{audit_type}"
+    headers = {"Authorization": f"Bearer {token}"}
+    params = dict(params, created_at=_utc_filter_string(start), pageSize=page_size)
+    if until_param:
+        params[until_param] = _utc_filter_string(end)
+
+    rows = {}
+    current = 1
+    while True:
+        body = api_client.get_page(endpoint, headers, params, current)
+        page = body.get("data", [])
+        if current == 1:
+            page_size = params["pageSize"] = server_page_size(body, page_size)
+        stamps = [audit_archive.created_ts(row.get("created_at")) for row in page]
+        for row, ts in zip(page, stamps):
+            if ts is not None and start <= ts < end:
+                rows[audit_archive.row_digest(row)] = (ts, row)
+        if len(page) < page_size:
+            break
+        known = [ts for ts in stamps if ts is not None]
+        if known and known[0] <= known[-1] and known[-1] >= end:
+            break
+        current += 1
+    return [row for ts, row in sorted(rows.values(), key=lambda item: item[0])]
+
+
+def check_window_order(url, token, audit_type, params, start, until_param=None):
+    """Exit when windows cannot be fetched shallowly from this server"""
+    if until_param:
+        return
+    endpoint = f"{url}/api/audits/{audit_type}"
+    headers = {"Authorization": f"Bearer {token}"}
+    probe = dict(params, created_at=_utc_filter_string(start), pageSize=50)
+    page = api_client.get_page(endpoint, headers, probe, 1).get("data", [])
+    stamps = [ts for ts in (audit_archive.created_ts(row.get("created_at")) for row in page) if ts is not None]
+    if len(stamps) > 1 and stamps[0] > stamps[-1]:
+        print(
+            "Error: the server lists audits newest first, so time windows would page "
+            "through every newer audit. Pass --until-param with the server's upper "
+            "created_at bound parameter, or export without --window"
+        )
+        exit(1)
+
+
+def iter_audit_windows(url, token, audit_type, params, windows, page_size=EXPORT_PAGE_SIZE,
+                       start_window=1, parallel=4, until_param=None):
+    """
+    Yield (window number, rows) for `windows` (a list of (start, end)
+    pairs, numbered from 1) from `start_window` on.
+
+    Up to `parallel` windows are fetched at once, each with shallow
+    pagination, and yielded in window order, so the rows come out sorted by
+    created_at. Every window in flight is held in memory; pick windows that
+    fit.
+    """
+    numbered = iter(list(enumerate(windows, 1))[start_window - 1:])
+    pending = deque()
+
+    def submit(executor, number, window):
+        pending.append((number, executor.submit(
+            fetch_window, url, token, audit_type, params, window[0], window[1],
+            page_size, until_param
+        )))
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        try:
+            for number, window in islice(numbered, parallel * 2):
+                submit(executor, number, window)
+            while pending:
+                number, future = pending.popleft()
+                for next_number, window in islice(numbered, 1):
+                    submit(executor, next_number, window)
+                yield number, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+# Fields that can be missing from the first rows of a type, e.g. the end of
+# connections still open; CSV exports always include these columns
+CSV_OPTIONAL_COLUMNS = {
+    "conn": ["end_time"],
+}
+
+
+class ExportWriter:
+    """
+    Appends rows to an NDJSON or CSV file, optionally gzip-compressed.
+
+    The CSV header is the fields of the first rows plus `optional_columns`
+    unless `columns` is given. A later row with a field not in the header
+    stops the export with an error rather than dropping the field.
+
+    `sync()` flushes everything written so far and returns the file size,
+    which is a safe point to truncate to when resuming. With gzip a new
+    member is started after each sync point; concatenated members still
+    decompress as one stream.
+    """
+
+    def __init__(self, path, fmt="ndjson", compress=False, offset=0, columns=None,
+                 optional_columns=None):
+        self.fmt = fmt
+        self.compress = compress
+        self.columns = columns
+        self.optional_columns = optional_columns or []
+        if path == "-":
+            self.raw = sys.stdout.buffer
+            self.owned = False
+        else:
+            self.raw = open(path, "r+b" if offset else "wb")
+            self.raw.seek(offset)
+            self.raw.truncate()
+            self.owned = True
+        self.gz = None
+
+    def _stream(self):
+        if not self.compress:
+            return self.raw
+        if self.gz is None:
+            self.gz = gzip.GzipFile(fileobj=self.raw, mode="wb")
+        return self.gz
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        if self.fmt == "csv":
+            buffer = io.StringIO()
+            if self.columns is None:
+                self.columns = list(dict.fromkeys(
+                    [key for row in rows for key in row] + self.optional_columns
+                ))
+                csv.writer(buffer).writerow(self.columns)
+            known = set(self.columns)
+            extra = {key for row in rows for key in row if key not in known}
+            if extra:
+                print(
+                    f"Error: audits have fields missing from the CSV header: {', '.join(sorted(extra))}; "
+                    "export as ndjson instead"
+                )
+                exit(1)
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow([_csv_value(row.get(column)) for column in self.columns])
+            text = buffer.getvalue()
+        else:
+            text = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        self._stream().write(text.encode("utf-8"))
+
+    def sync(self):
+        if self.gz is not None:
+            self.gz.close()
+            self.gz = None
+        self.raw.flush()
+        return self.raw.tell() if self.owned else None
+
+    def close(self):
+        self.sync()
+        if self.owned:
+            self.raw.close()
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_json(path, state):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def export_audits(url, token, audit_type, filters=None, created_at=None, days_ago=None,
+                  non_wildcard_fields=None, output="-", fmt="ndjson", compress=False,
+                  page_size=EXPORT_PAGE_SIZE, parallel=4, raw=False, resume=True,
+                  checkpoint_every=CHECKPOINT_EVERY, window=None, until=None,
+                  until_param=None):
+    """
+    Export every audit of a type matching the filters to `output`.
+
+    Pages are fetched concurrently and streamed to the file in page order,
+    so memory use does not grow with the export. Unless writing to stdout,
+    `<output>.checkpoint` records the last page written and the matching
+    file offset every `checkpoint_every` pages; re-running the same export
+    truncates the file to that offset and continues with the next page.
+    The checkpoint is removed when the export completes. Rows pushed onto
+    the next page by audits created meanwhile are de-duplicated against the
+    last page written only: on a newest-first server, resuming after more
+    than a page of new audits writes the overflow rows again. Windowed
+    exports fetch fixed time ranges and are not affected.
+
+    With `window` (seconds) the range from the created_at/days_ago start to
+    `until` (default: now) is split into time windows that are fetched in
+    parallel with shallow pagination instead of deep page offsets, see
+    iter_audit_windows. Checkpoints then count windows instead of pages.
+
+    Rows are decorated like the view commands unless `raw` is set. Returns
+    the number of rows written in this run.
+    """
+    checkpoint = None if output == "-" else output + ".checkpoint"
+    key = {
+        "type": audit_type,
+        "filters": {k: v for k, v in (filters or {}).items() if v is not None},
+        "created_at": created_at,
+        "days_ago": days_ago,
+        "format": fmt,
+        "gzip": compress,
+        "raw": raw,
+        "window": window,
+        "until": until,
+        "until_param": until_param,
+    }
+
+    state = _load_json(checkpoint) if checkpoint and resume else None
+    if state is not None and not os.path.exists(output):
+        state = None
+    if state is not None and state.get("key") != key:
+        print(f"Error: {checkpoint} belongs to a different export, use --no-resume to start over")
+        exit(1)
+
+    headers = {"Authorization": f"Bearer {token}"}
+    endpoint = f"{url}/api/audits/{audit_type}"
+    if state is not None:
+        # Reuse the stored parameters so --days-ago keeps its original cutoff
+        params = state["params"]
+        page_size = state["page_size"]
+        start_page = state["page"] + 1
+        previous = set(state.get("last_rows", []))
+        written = state["rows"]
+        time_range = state.get("range")
+        print(
+            f"Resuming export at {'window' if window else 'page'} {start_page} ({written} rows written)",
+            file=sys.stderr,
+        )
+    else:
+        params = build_audit_params(filters, created_at, days_ago, non_wildcard_fields)
+        start_page = 1
+        previous = set()
+        written = 0
+        time_range = None
+        if window:
+            if "created_at" not in params:
+                print("Error: --window needs a start time (--created-at or --days-ago)")
+                exit(1)
+            end = datetime.now(timezone.utc).timestamp()
+            if until:
+                end = audit_archive.created_ts(build_audit_params(created_at=until)["created_at"])
+            time_range = [audit_archive.created_ts(params.pop("created_at")), end]
+            check_window_order(url, token, audit_type, params, time_range[0], until_param)
+
+    if window:
+        windows = split_windows(time_range[0], time_range[1], window)
+        unit, units = "window", len(windows)
+        source = iter_audit_windows(
+            url, token, audit_type, params, windows, page_size, start_page, parallel, until_param
+        )
+    else:
+        first = api_client.get_page(endpoint, headers, dict(params, pageSize=page_size), start_page)
+        if state is None:
+            # Same as iter_audit_pages does, known here for the checkpoints
+            page_size = server_page_size(first, page_size)
+        unit, units = "page", (first.get("total", 0) + page_size - 1) // page_size
+        source = iter_audit_pages(
+            url, token, audit_type, params, page_size, start_page, parallel, first
+        )
+
+    writer = ExportWriter(
+        output, fmt, compress,
+        offset=state["offset"] if state else 0,
+        columns=state.get("columns") if state else None,
+        optional_columns=CSV_OPTIONAL_COLUMNS.get(audit_type),
+    )
+    rows_this_run = 0
+    try:
+        for page, rows in source:
+            # Rows pushed across a page boundary by new audits show up twice
+            keys = [audit_archive.row_digest(row) for row in rows]
+            rows = [row for row, k in zip(rows, keys) if k not in previous]
+            previous = set(keys)
+            if not raw:
+                rows = enhance_audit_data(rows, audit_type)
+            writer.write_rows(rows)
+            written += len(rows)
+            rows_this_run += len(rows)
+
+            if checkpoint and (page - start_page + 1) % checkpoint_every == 0:
+                _save_json(checkpoint, {
+                    "key": key,
+                    "params": params,
+                    "page_size": page_size,
+                    "page": page,
+                    "range": time_range,
+                    "offset": writer.sync(),
+                    "rows": written,
+                    "columns": writer.columns,
+                    "last_rows": keys,
+                })
+                if sys.stderr.isatty():
+                    print(f"\rExported {written} rows, {unit} {page}/{units}", end="", file=sys.stderr)
+    finally:
+        writer.close()
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    print(f"\r{f'Exported {written} rows':<40}", file=sys.stderr)
+    return rows_this_run
+
+
+# Seconds between polls of the follow command: reset to the minimum after
+# new audits arrive, doubled after each empty poll up to the maximum
+FOLLOW_MIN_INTERVAL = 2.0
+FOLLOW_MAX_INTERVAL = 60.0
+
+
+def default_follow_state_path():
+    return os.path.join(os.path.dirname(inventory_cache.default_path()), "audit-follow.json")
+
+
+def _poll_page(url, headers, params, current):
+    """Like api_client.get_page, but raises ApiError instead of exiting"""
+    result = api_client.parse_response(
+        api_client.get(url, headers=headers, params=dict(params, current=current))
+    )
+    if not isinstance(result, dict):
+        raise api_client.ApiError(f"Unexpected response: {str(result)[:200]}")
+    return result
+
+
+def poll_new_audits(url, token, audit_type, params, cursor, page_size=EXPORT_PAGE_SIZE):
+    """
+    Fetch audits created at or after the cursor's high-water mark.
+
+    `cursor` is {"created_at": seconds, "seen": [digests of rows at exactly
+    that time]}. Rows older than the mark or already seen are skipped.
+    Returns (new rows sorted oldest first, updated cursor). API errors raise
+    ApiError instead of exiting.
+    """
+    mark = cursor.get("created_at")
+    seen = set(cursor.get("seen", []))
+    params = dict(params)
+    if mark is not None:
+        # The filter has millisecond precision; finer ties are removed below
+        params["created_at"] = _utc_filter_string(mark)
+
+    new_rows = {}
+    for _, rows in iter_audit_pages(url, token, audit_type, params, page_size, parallel=1,
+                                    get_page=_poll_page):
+        for row in rows:
+            ts = audit_archive.created_ts(row.get("created_at"))
+            if mark is not None and ts is not None and ts < mark:
+                continue
+            digest = audit_archive.row_digest(row)
+            if digest not in seen:
+                new_rows[digest] = (ts, row)
+    if not new_rows:
+        return [], cursor
+
+    ordered = sorted(new_rows.items(), key=lambda item: item[1][0] or 0)
+    stamps = [ts for _, (ts, _) in ordered if ts is not None]
+    last = max(stamps) if stamps else mark
+    if last == mark:
+        seen.update(digest for digest, _ in ordered)
+    else:
+        seen = {digest for digest, (ts, _) in ordered if ts == last}
+    return [row for _, (_, row) in ordered], {"created_at": last, "seen": sorted(seen)}
+
+
+def follow_audits(url, token, audit_types, filters_by_type, since=None, state_path=None,
+                  raw=False, once=False, min_interval=FOLLOW_MIN_INTERVAL,
+                  max_interval=FOLLOW_MAX_INTERVAL):
+    """
+    Poll audit lists and print audits as NDJSON as they are created.
+
+    A created_at high-water mark per server and audit type is kept in
+    `state_path` and saved after every batch is written, so a restarted
+    follower continues where it stopped (a crash in between can repeat,
+    never skip, a batch). Without saved state the follower starts at `since`
+    (a UTC filter string) or at the current time. Each emitted row carries
+    its audit type in "audit_type".
+
+    All polling runs in this thread over one pooled connection. The
+    interval of each type adapts between min_interval and max_interval. A
+    failed poll (connection error, or an API error such as a 5xx or 401
+    that outlasts the client's retries) is reported on stderr and tried
+    again after max_interval.
+    """
+    state_path = state_path or default_follow_state_path()
+    state = _load_json(state_path) or {}
+    server_state = state.setdefault(url, {})
+
+    start = audit_archive.created_ts(since) if since else datetime.now(timezone.utc).timestamp()
+    params_by_type = {}
+    for audit_type in audit_types:
+        filters, non_wildcard_fields = filters_by_type[audit_type]
+        params_by_type[audit_type] = build_audit_params(filters, None, None, non_wildcard_fields)
+        server_state.setdefault(audit_type, {"created_at": start, "seen": []})
+
+    intervals = dict.fromkeys(audit_types, min_interval)
+    next_poll = dict.fromkeys(audit_types, 0.0)
+    while True:
+        audit_type = min(audit_types, key=next_poll.get)
+        delay = next_poll[audit_type] - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        try:
+            rows, cursor = poll_new_audits(
+                url, token, audit_type, params_by_type[audit_type], server_state[audit_type]
+            )
+        except (OSError, api_client.ApiError) as e:
+            # Keep following through outages and expired tokens; back off meanwhile
+            print(f"Warning: polling {audit_type} audits failed: {e}", file=sys.stderr)
+            rows = []
+            intervals[audit_type] = max_interval
+        else:
+            if rows:
+                if not raw:
+                    rows = enhance_audit_data(rows, audit_type)
+                sys.stdout.write("".join(
+                    json.dumps(dict(row, audit_type=audit_type), ensure_ascii=False) + "\n"
+                    for row in rows
+                ))
+                sys.stdout.flush()
+                server_state[audit_type] = cursor
+                _save_json(state_path, state)
+                intervals[audit_type] = min_interval
+            else:
+                intervals[audit_type] = min(max_interval, intervals[audit_type] * 2)
+        next_poll[audit_type] = time.monotonic() + intervals[audit_type]
+
+        if once and all(t > 0 for t in next_poll.values()):
+            return
+
+
+def archive_audits(url, token, audit_types, since=None, path=None, parallel=4,
+                   page_size=EXPORT_PAGE_SIZE):
+    """
+    Copy audits into the local archive (see audit_archive). Each type is
+    fetched from `since` (a UTC filter string), or else from the newest
+    audit already archived (earlier for connections archived while still
+    open, see Archive.refresh_from), so repeated runs mostly download new
+    audits and archived rows are updated in place.
+    """
+    archive = audit_archive.Archive(path)
+    try:
+        for audit_type in audit_types:
+            params = {}
+            start = audit_archive.created_ts(since) if since else archive.refresh_from(audit_type)
+            if start is not None:
+                params["created_at"] = _utc_filter_string(start)
+            fetched = added = 0
+            for _, rows in iter_audit_pages(url, token, audit_type, params, page_size, parallel=parallel):
+                fetched += len(rows)
+                added += archive.store(audit_type, rows)
+            print(f"Archived {added} new or updated {audit_type} audits ({fetched} fetched)")
+    finally:
+        archive.close()
+
+
+def _archive_filters(audit_type, filters):
+    return dict(filters or {}, audit_type=audit_type)
+
+
+def iter_archive(audit_types=None, filters=None, since=None, until=None, limit=None,
+                 path=None, raw=False):
+    """
+    Yield archived audits matching the filters, oldest first per type, each
+    with its "audit_type". Rows are decorated like the view commands unless
+    raw. `since`/`until` are UTC filter strings.
+    """
+    archive = audit_archive.Archive(path)
+    since = audit_archive.created_ts(since) if since else None
+    until = audit_archive.created_ts(until) if until else None
+    try:
+        for audit_type in audit_types or [None]:
+            for row_type, row in archive.rows(
+                _archive_filters(audit_type, filters), since, until, limit
+            ):
+                if not raw:
+                    row = enhance_audit_data([row], row_type)[0]
+                yield dict(row, audit_type=row_type)
+    finally:
+        archive.close()
+
+
+def group_archive(group_by, audit_types=None, filters=None, since=None, until=None,
+                  limit=None, path=None):
+    """Count archived audits per group, largest groups first"""
+    archive = audit_archive.Archive(path)
+    since = audit_archive.created_ts(since) if since else None
+    until = audit_archive.created_ts(until) if until else None
+    try:
+        results = []
+        for audit_type in audit_types or [None]:
+            results.extend(archive.group(
+                group_by, _archive_filters(audit_type, filters), since, until, limit
+            ))
+    finally:
+        archive.close()
+    for group in results:
+        group["first"] = format_timestamp(group["first"])
+        group["last"] = format_timestamp(group["last"])
+    results.sort(key=lambda group: -group["count"])
+    return results[:limit] if limit else results
+
+
+def compute_audit_stats(sources, top=20, capacity=audit_stats.HEAVY_HITTERS):
+    """
+    Compute statistics over `sources`, an iterable of (audit type, rows
+    iterable) pairs, in one pass without keeping the rows.
+    """
+    stats = audit_stats.AuditStats(capacity, get_connection_type_name, get_alarm_type_name)
+    for audit_type, rows in sources:
+        for row in rows:
+            stats.add(row, audit_type)
+    return stats.report(top)
+
+
+def iter_live_audits(url, token, audit_type, params, page_size=EXPORT_PAGE_SIZE, parallel=4):
+    """Rows of an audit list straight from the API, page by page"""
+    for _, rows in iter_audit_pages(url, token, audit_type, params, page_size, parallel=parallel):
+        yield from rows
+
+
+def parse_audit_types(value):
+    """Comma separated audit types (default: all), None after an error"""
+    audit_types = value.split(",") if value else AUDIT_TYPES
+    for audit_type in audit_types:
+        if audit_type not in AUDIT_TYPES:
+            print(f"Error: unknown audit type '{audit_type}'")
+            return None
+    return audit_types
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Audits manager")
     parser.add_argument(
         "command",
-        choices=["view-conn", "view-file", "view-alarm", "view-console"],
+        choices=["view-conn", "view-file", "view-alarm", "view-console", "export", "follow",
+                 "archive", "query", "stats"],
         help="Command to execute",
     )
-    parser.add_argument("--url", required=True, help="URL of the API")
-    parser.add_argument("--token", required=True, help="Bearer token for authentication")
+    parser.add_argument("--url", help="URL of the API (not needed for query)")
+    parser.add_argument("--token", help="Bearer token for authentication (not needed for query)")
     
     # Pagination parameters
-    parser.add_argument("--page-size", type=int, default=10, help="Number of records per page (default: 10)")
+    parser.add_argument("--page-size", type=int, help=f"Number of records per page (default: 10, export: {EXPORT_PAGE_SIZE})")
     parser.add_argument("--current", type=int, default=1, help="Current page number (default: 1)")
     
     # Time filtering parameters
@@ -310,10 +992,50 @@ def main():
     parser.add_argument("--conn-type", type=int, help="Connection type filter (for conn audits only): 0=Remote Desktop, 1=File Transfer, 2=Port Transfer, 3=View Camera, 4=Terminal")
     parser.add_argument("--operator", help="Operator filter (for console audits only)")
 
-    args = parser.parse_args()
+    # Export parameters
+    parser.add_argument("--type", help=f"Audit type to export, or comma separated types to follow (default: all): {', '.join(AUDIT_TYPES)}")
+    parser.add_argument("--output", default="-", help="Export file (default: stdout, no checkpoint)")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson", help="Export format (default: ndjson)")
+    parser.add_argument("--gzip", action="store_true", help="Compress the export with gzip")
+    parser.add_argument("--parallel", type=int, default=4, help="Pages fetched concurrently by export (default: 4)")
+    parser.add_argument("--raw", action="store_true", help="Export rows as returned by the API, without readable names")
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Ignore an existing export checkpoint and start over. On newest-first servers a resumed "
+        "export can repeat rows if over a page of audits was created in between; --window exports cannot",
+    )
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY, help=f"Pages between export checkpoints (default: {CHECKPOINT_EVERY})")
+
+    parser.add_argument("--window", help="Export in parallel time windows of this length (e.g. 6h, 1d) starting at --created-at/--days-ago")
+    parser.add_argument("--until", help="End time in local time for windowed export and query (default: now)")
+    parser.add_argument("--until-param", help="Query parameter the server accepts as upper created_at bound, if any")
+
+    # Follow parameters
+    parser.add_argument("--state-file", help="Follow high-water mark file (default: audit-follow.json in the cache directory)")
+    parser.add_argument("--min-interval", type=float, default=FOLLOW_MIN_INTERVAL, help=f"Shortest follow poll interval in seconds (default: {FOLLOW_MIN_INTERVAL:g})")
+    parser.add_argument("--max-interval", type=float, default=FOLLOW_MAX_INTERVAL, help=f"Longest follow poll interval in seconds (default: {FOLLOW_MAX_INTERVAL:g})")
+    parser.add_argument("--once", action="store_true", help="Poll every audit type once and exit (e.g. from cron)")
+
+    # Archive parameters
+    parser.add_argument("--archive", help="Local audit archive file (default: audits.sqlite3 in the cache directory)")
+    parser.add_argument("--group-by", help=f"Comma separated query group keys: {', '.join(audit_archive.COLUMNS + list(audit_archive.TIME_GROUPS))}")
+    parser.add_argument("--limit", type=int, help="Maximum number of query results")
+
+    # Stats parameters
+    parser.add_argument("--input", action="append", help="Export/follow file to compute stats from instead of the API (repeatable, - for stdin)")
+    parser.add_argument("--top", type=int, default=20, help="Entries in each stats top list (default: 20)")
+
+    api_client.add_client_arguments(parser)
+
+    args = parser.parse_args(argv)
+    offline = args.command == "query" or (args.command == "stats" and args.input)
+    if not offline and not (args.url and args.token):
+        parser.error("--url and --token are required")
+    api_client.configure_from_args(args)
 
     # Remove trailing slashes from URL
-    while args.url.endswith("/"):
+    while args.url and args.url.endswith("/"):
         args.url = args.url[:-1]
 
     if args.command == "view-conn":
@@ -368,6 +1090,145 @@ def main():
             args.days_ago
         )
         print(json.dumps(result, indent=2))
+    
+    elif args.command == "export":
+        if args.type not in AUDIT_TYPES:
+            print(f"Error: --type must be one of {', '.join(AUDIT_TYPES)} for export command")
+            return
+        
+        filters, non_wildcard_fields = audit_filters(
+            args.type, args.remote, args.conn_type, args.device, args.operator
+        )
+        try:
+            export_audits(
+                args.url,
+                args.token,
+                args.type,
+                filters,
+                args.created_at,
+                args.days_ago,
+                non_wildcard_fields,
+                args.output,
+                args.format,
+                args.gzip,
+                args.page_size or EXPORT_PAGE_SIZE,
+                args.parallel,
+                args.raw,
+                not args.no_resume,
+                max(1, args.checkpoint_every),
+                window=parse_duration(args.window) if args.window else None,
+                until=args.until,
+                until_param=args.until_param,
+            )
+        except BrokenPipeError:
+            # Output piped into e.g. head; stop quietly
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    
+    elif args.command == "follow":
+        audit_types = parse_audit_types(args.type)
+        if audit_types is None:
+            return
+        
+        filters_by_type = {
+            audit_type: audit_filters(audit_type, args.remote, args.conn_type, args.device, args.operator)
+            for audit_type in audit_types
+        }
+        since = None
+        if args.days_ago is not None or args.created_at:
+            since = build_audit_params(created_at=args.created_at, days_ago=args.days_ago)["created_at"]
+        
+        # One poller, one connection
+        api_client.configure(pool_size=1)
+        try:
+            follow_audits(
+                args.url,
+                args.token,
+                audit_types,
+                filters_by_type,
+                since,
+                args.state_file,
+                args.raw,
+                args.once,
+                args.min_interval,
+                args.max_interval,
+            )
+        except KeyboardInterrupt:
+            pass
+        except BrokenPipeError:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    
+    elif args.command == "archive":
+        audit_types = parse_audit_types(args.type)
+        if audit_types is None:
+            return
+        
+        since = None
+        if args.days_ago is not None or args.created_at:
+            since = build_audit_params(created_at=args.created_at, days_ago=args.days_ago)["created_at"]
+        archive_audits(
+            args.url,
+            args.token,
+            audit_types,
+            since,
+            args.archive,
+            args.parallel,
+            args.page_size or EXPORT_PAGE_SIZE,
+        )
+    
+    elif args.command == "query":
+        audit_types = parse_audit_types(args.type) if args.type else None
+        if args.type and audit_types is None:
+            return
+        
+        # Exact match on the indexed columns, LIKE when the value contains %
+        filters = {
+            "remote": args.remote,
+            "device": args.device,
+            "operator": args.operator,
+            "conn_type": args.conn_type,
+        }
+        since = None
+        if args.days_ago is not None or args.created_at:
+            since = build_audit_params(created_at=args.created_at, days_ago=args.days_ago)["created_at"]
+        until = build_audit_params(created_at=args.until)["created_at"] if args.until else None
+        group_by = [key.strip() for key in args.group_by.split(",")] if args.group_by else None
+        try:
+            if group_by:
+                result = group_archive(
+                    group_by, audit_types, filters, since, until, args.limit, args.archive
+                )
+                print(json.dumps(result, indent=2, ensure_ascii=False))
+            else:
+                for row in iter_archive(
+                    audit_types, filters, since, until, args.limit, args.archive, args.raw
+                ):
+                    print(json.dumps(row, ensure_ascii=False))
+        except ValueError as e:
+            print(f"Error: {e}")
+            exit(1)
+        except BrokenPipeError:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    
+    elif args.command == "stats":
+        if args.input:
+            # Rows of a follow output name their own type, export files need --type
+            audit_type = args.type if args.type in AUDIT_TYPES else None
+            sources = [(audit_type, audit_stats.iter_export_file(path)) for path in args.input]
+        else:
+            audit_types = parse_audit_types(args.type)
+            if audit_types is None:
+                return
+            sources = []
+            for audit_type in audit_types:
+                filters, non_wildcard_fields = audit_filters(
+                    audit_type, args.remote, args.conn_type, args.device, args.operator
+                )
+                params = build_audit_params(filters, args.created_at, args.days_ago, non_wildcard_fields)
+                sources.append((audit_type, iter_live_audits(
+                    args.url, args.token, audit_type, params,
+                    args.page_size or EXPORT_PAGE_SIZE, args.parallel
+                )))
+        print(json.dumps(compute_audit_stats(sources, args.top), indent=2, ensure_ascii=False))
 
 
 if __name__ == "__main__":
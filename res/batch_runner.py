@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+
+"""
+Run a file of admin operations in one process (mdesk-admin.py run FILE).
+
+    - name: lab-group
+      area: device-groups
+      args: add --name lab
+    - name: stale
+      area: devices
+      args: disable --device_group_name lab --offline_days 90
+      yes: true                # adds --yes, only devices and users have it
+    - name: audits
+      area: audits
+      args: export --type conn --output conn.ndjson
+      needs: []
+
+Files ending in .yaml/.yml are YAML (needs PyYAML), .json a JSON list, and
+anything else NDJSON with one step per line. `args` is a command line as a
+string or a list; --url and --token come from the profile like for single
+calls.
+
+Every step runs the script's main() in this process, so the steps share one
+pooled HTTP session (sized once with --pool-size), the inventory cache and
+one name resolver: a group or user resolved by one step is not looked up
+again by the next. Client and cache options of a step (--timeout,
+--no-cache, ...) apply to the whole process.
+
+A step without `needs` starts after the step before it; a step with `needs`
+waits only for the steps it names, so independent steps run concurrently
+(up to --concurrency at a time). Each step's output is printed as one block
+when it finishes. Steps that need a failed step are skipped. Steps cannot
+prompt: one that asks for confirmation fails unless it has `yes: true`.
+"""
+
+import argparse
+import io
+import json
+import shlex
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import api_client
+
+DEFAULT_POOL_SIZE = 32
+
+
+def load_steps(path, areas):
+    """Read and check a step file; returns a list of step dicts"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            print("Error: PyYAML is required for YAML files (pip install pyyaml), or use JSON")
+            exit(1)
+        raw = yaml.safe_load(text) or []
+    elif path.endswith(".json"):
+        raw = json.loads(text)
+    else:
+        raw = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if not isinstance(raw, list):
+        print(f"Error: {path} must hold a list of steps")
+        exit(1)
+
+    steps = []
+    names = set()
+    for number, entry in enumerate(raw, 1):
+        if not isinstance(entry, dict) or entry.get("area") not in areas:
+            print(f"Error: step {number} needs an area, one of: {', '.join(areas)}")
+            exit(1)
+        name = str(entry.get("name") or number)
+        if name in names:
+            print(f"Error: duplicate step name '{name}'")
+            exit(1)
+        args = entry.get("args") or []
+        args = shlex.split(args) if isinstance(args, str) else [str(arg) for arg in args]
+        if entry.get("yes"):
+            args.append("--yes")
+        needs = entry.get("needs")
+        if needs is None:
+            needs = [steps[-1]["name"]] if steps else []
+        elif isinstance(needs, str):
+            needs = [needs]
+        # Only earlier steps can be needed, which also rules out cycles
+        for need in needs:
+            if str(need) not in names:
+                print(f"Error: step '{name}' needs '{need}', which is not an earlier step")
+                exit(1)
+        names.add(name)
+        steps.append({"name": name, "area": entry["area"], "args": args,
+                      "needs": [str(need) for need in needs]})
+    return steps
+
+
+class ThreadOutput:
+    """
+    Stand-in for sys.stdout/sys.stderr that writes to the buffer of the
+    step running in the current thread, or to the real stream otherwise.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def _target(self):
+        return getattr(self.local, "buffer", None) or self.stream
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def isatty(self):
+        return self._target().isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+def run_step(step, call, stdout, stderr):
+    """Run one step with its output captured; returns its result dict"""
+    # Binary writes (e.g. exports to "-") go to the same bytes as text ones
+    buffer = io.TextIOWrapper(io.BytesIO(), encoding="utf-8", write_through=True)
+    stdout.local.buffer = stderr.local.buffer = buffer
+    status, code = "ok", 0
+    start = time.perf_counter()
+    try:
+        call(step["area"], step["args"])
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            print(e.code)
+        code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        if code:
+            status = "failed"
+    except EOFError:
+        print("Error: the step asked for confirmation; add `yes: true` to it")
+        status, code = "failed", 1
+    except Exception:
+        traceback.print_exc()
+        status, code = "failed", 1
+    finally:
+        stdout.local.buffer = stderr.local.buffer = None
+    return {
+        "name": step["name"],
+        "status": status,
+        "exit_code": code,
+        "seconds": time.perf_counter() - start,
+        "output": buffer.buffer.getvalue().decode("utf-8", errors="replace"),
+    }
+
+
+def run_steps(steps, call, concurrency=4):
+    """
+    Run the steps as their `needs` allow, calling call(area, args) for each.
+    Returns the results in step order.
+    """
+    concurrency = max(1, concurrency)
+    real_stdin, real_stdout, real_stderr = sys.stdin, sys.stdout, sys.stderr
+    stdout, stderr = ThreadOutput(real_stdout), ThreadOutput(real_stderr)
+    # No step may block on input()
+    sys.stdin, sys.stdout, sys.stderr = io.StringIO(), stdout, stderr
+
+    results = {}
+    waiting = list(steps)
+    pending = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while waiting or pending:
+                for step in list(waiting):
+                    needs = [results.get(need) for need in step["needs"]]
+                    if any(result and result["status"] != "ok" for result in needs):
+                        waiting.remove(step)
+                        results[step["name"]] = {
+                            "name": step["name"], "status": "skipped", "exit_code": None,
+                            "seconds": 0.0, "output": "",
+                        }
+                        print(f"== {step['name']}: skipped", file=real_stdout, flush=True)
+                    elif all(needs) and len(pending) < concurrency:
+                        waiting.remove(step)
+                        future = executor.submit(run_step, step, call, stdout, stderr)
+                        pending[future] = step
+                if not pending:
+                    continue
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = pending.pop(future)
+                    result = future.result()
+                    results[step["name"]] = result
+                    print(
+                        f"== {step['name']} ({step['area']} {' '.join(step['args'])}): "
+                        f"{result['status']} in {result['seconds']:.2f}s",
+                        file=real_stdout,
+                    )
+                    real_stdout.write(result["output"])
+                    real_stdout.flush()
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = real_stdin, real_stdout, real_stderr
+    return [results[step["name"]] for step in steps]
+
+
+def print_report(results, elapsed):
+    width = max([len(result["name"]) for result in results] + [4])
+    print(f"\n{'step':<{width}}  {'status':<8} {'seconds':>8}")
+    for result in results:
+        print(f"{result['name']:<{width}}  {result['status']:<8} {result['seconds']:>8.2f}")
+    busy = sum(result["seconds"] for result in results)
+    print(f"{len(results)} steps in {elapsed:.2f}s (step time {busy:.2f}s)")
+
+
+def main(argv, areas, call):
+    """
+    Entry point of mdesk-admin.py run; `call(area, args)` runs one step's
+    script with the profile defaults applied.
+    """
+    parser = argparse.ArgumentParser(description="Run a file of admin operations in one process")
+    parser.add_argument("file", help="Step file: YAML, JSON list or NDJSON")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of independent steps to run at the same time (default: 4)",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=DEFAULT_POOL_SIZE,
+        help=f"HTTP connections shared by all steps (default: {DEFAULT_POOL_SIZE})",
+    )
+    parser.add_argument("--report-json", metavar="FILE", help="Also write the step timings to FILE")
+    args = parser.parse_args(argv)
+
+    steps = load_steps(args.file, areas)
+    api_client.fix_pool_size(args.pool_size)
+
+    start = time.perf_counter()
+    results = run_steps(steps, call, args.concurrency)
+    print_report(results, time.perf_counter() - start)
+
+    if args.report_json:
+        with open(args.report_json, "w") as f:
+            json.dump(
+                [{k: v for k, v in result.items() if k != "output"} for result in results],
+                f,
+                indent=2,
+            )
+    if any(result["status"] != "ok" for result in results):
+        exit(1)
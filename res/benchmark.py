@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark suite for the admin scripts, run against mock_console.py.
+
+For every dataset size a mock console is started in its own process, then
+each scenario runs the real script in a subprocess. The report shows the
+requests the server saw, the wall time and the script's peak resident
+memory. The server runs separately so that its dataset neither competes
+for this process's CPU nor shows up in the scripts' memory peaks.
+
+    python3 benchmark.py [--sizes 1000,10000,100000] [--latency 0.002]
+                         [--only export] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import mock_console
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (script, arguments, stdin); {tmp} is a scratch directory
+SCENARIOS = [
+    ("devices view", "devices.py", ["view", "--output", "ndjson", "--no-cache"], None),
+    ("devices view --parallel 8", "devices.py",
+     ["view", "--output", "ndjson", "--no-cache", "--parallel", "8"], None),
+    ("users view", "users.py", ["view"], None),
+    ("devices disable (one group)", "devices.py",
+     ["disable", "--device_group_name", "dgroup0", "--no-cache", "--concurrency", "16"], "Y\n"),
+    ("audits export conn", "audits.py",
+     ["export", "--type", "conn", "--raw", "--parallel", "8", "--output", "{tmp}/conn.ndjson"], None),
+    ("audits stats (export file)", "audits.py",
+     ["stats", "--type", "conn", "--input", "{tmp}/conn.ndjson"], None),
+]
+
+
+class Console:
+    """A mock_console.py server process"""
+
+    def __init__(self, size, args):
+        argv = [
+            sys.executable, os.path.join(HERE, "mock_console.py"), "--port", "0",
+            "--size", str(size), "--latency", str(args.latency),
+            "--max-page-size", str(args.max_page_size), "--audit-order", args.audit_order,
+            "--error-rate", str(args.error_rate),
+        ]
+        if args.until_param:
+            argv += ["--until-param", args.until_param]
+        self.process = subprocess.Popen(argv, stdout=subprocess.PIPE, text=True)
+        # First line: "Mock console on http://host:port (...)"
+        self.url = self.process.stdout.readline().split()[3]
+
+    def _stats(self, method):
+        request = urllib.request.Request(f"{self.url}/__stats", method=method)
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+
+    def stats(self):
+        return self._stats("GET")
+
+    def reset_stats(self):
+        self._stats("POST")
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def peak_memory_mb(rusage):
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return rusage.ru_maxrss / divisor
+
+
+def run_scenario(console, script, arguments, stdin, tmp):
+    """Run one script against the console; returns its measurements"""
+    argv = [sys.executable, os.path.join(HERE, script)]
+    argv += [arg.format(tmp=tmp) for arg in arguments]
+    argv += ["--url", console.url, "--token", "benchmark"]
+    env = dict(os.environ, MDESK_CACHE_DIR=os.path.join(tmp, "cache"))
+
+    console.reset_stats()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        argv,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        cwd=HERE,
+        env=env,
+    )
+    if stdin:
+        process.stdin.write(stdin.encode())
+    process.stdin.close()
+    stderr = process.stderr.read()
+    # wait4 reports the rusage of this child alone
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start
+    stats = console.stats()
+
+    return {
+        "exit_code": process.returncode,
+        "requests": stats["requests"],
+        "bytes": stats["bytes"],
+        "wall_seconds": round(wall, 3),
+        "peak_mb": round(peak_memory_mb(rusage), 1),
+        "stderr": stderr.decode(errors="replace")[-500:] if process.returncode else "",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the admin scripts against a mock console")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma separated dataset sizes (default: 1000,10000,100000)")
+    parser.add_argument("--only", help="Run only scenarios whose name contains this text")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    mock_console.add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [s for s in SCENARIOS if not args.only or args.only in s[0]]
+    results = []
+    print(f"{'scenario':<30} {'size':>7} {'requests':>9} {'wall s':>8} {'peak MB':>8}")
+    for size in [int(x) for x in args.sizes.split(",")]:
+        console = Console(size, args)
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                for name, script, arguments, stdin in scenarios:
+                    result = run_scenario(console, script, arguments, stdin, tmp)
+                    result.update(scenario=name, size=size)
+                    results.append(result)
+                    line = (
+                        f"{name:<30} {size:>7} {result['requests']:>9} "
+                        f"{result['wall_seconds']:>8.2f} {result['peak_mb']:>8.1f}"
+                    )
+                    if result["exit_code"]:
+                        line += f"  FAILED (exit {result['exit_code']})"
+                    print(line, flush=True)
+                    if result["stderr"]:
+                        print(result["stderr"], file=sys.stderr)
+        finally:
+            console.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if any(result["exit_code"] for result in results):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+"""
+Bulk executor for the console admin scripts.
+
+Runs one API call per item with a bounded number of concurrent workers, an
+optional requests-per-second cap to protect the API server, a live progress
+line on stderr and a final summary of failures.
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Seconds before the first retry of a failed item, doubled on each attempt
+RETRY_BACKOFF = 0.5
+
+
+class RateLimiter:
+    """Spread calls evenly so that at most `rate` start per second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class Progress:
+    """Live "done/total, rate" line on stderr, only when stderr is a terminal"""
+
+    def __init__(self, label, total=None, stream=None):
+        self.label = label
+        self.total = total
+        self.stream = stream or sys.stderr
+        self.enabled = self.stream.isatty()
+        self.done = 0
+        self.failed = 0
+        self.start = time.monotonic()
+        self.last_draw = 0
+        self.lock = threading.Lock()
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def line(self):
+        elapsed = self.elapsed()
+        rate = self.done / elapsed if elapsed > 0 else 0
+        total = f"/{self.total}" if self.total is not None else ""
+        return (
+            f"{self.label}: {self.done}{total} done, {self.failed} failed, "
+            f"{rate:.1f}/s, {elapsed:.1f}s"
+        )
+
+    def update(self, ok, message=None):
+        """Record one finished item, printing `message` above the progress line"""
+        with self.lock:
+            self.done += 1
+            if not ok:
+                self.failed += 1
+            if message is not None:
+                self._clear()
+                print(message, flush=True)
+            now = time.monotonic()
+            if self.enabled and (now - self.last_draw >= 0.2 or message is not None):
+                self.stream.write("\r" + self.line())
+                self.stream.flush()
+                self.last_draw = now
+
+    def _clear(self):
+        if self.enabled and self.last_draw:
+            self.stream.write("\r\033[K")
+            self.stream.flush()
+
+    def finish(self):
+        with self.lock:
+            self._clear()
+
+
+def run_bulk(action, items, concurrency=1, rate=None, label="Bulk", describe=str, total=None,
+             retries=0, retry_on=(Exception,), verbose=True):
+    """
+    Call `action(item)` for every item and report as they finish.
+
+    `items` may be any iterable, including a generator; at most
+    2 * concurrency items are pulled ahead of the workers. Exceptions raised
+    by `action` that match `retry_on` are retried up to `retries` times with
+    exponential backoff, then recorded as failures instead of aborting the run. With
+    verbose=False only failures are printed per item.
+
+    Returns (succeeded, failures) where failures is a list of (item, error).
+    """
+    if total is None and hasattr(items, "__len__"):
+        total = len(items)
+    concurrency = max(1, concurrency)
+    limiter = RateLimiter(rate)
+    progress = Progress(label, total)
+    failures = []
+    succeeded = 0
+
+    def call(item):
+        for attempt in range(retries + 1):
+            limiter.acquire()
+            try:
+                return action(item)
+            except retry_on:
+                if attempt == retries:
+                    raise
+                time.sleep(min(RETRY_BACKOFF * 2 ** attempt, 30))
+
+    items = iter(items)
+    pending = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            while True:
+                while len(pending) < concurrency * 2:
+                    item = next(items, StopIteration)
+                    if item is StopIteration:
+                        break
+                    pending[executor.submit(call, item)] = item
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        failures.append((item, e))
+                        progress.update(False, f"{label} {describe(item)}: Error: {e}")
+                    else:
+                        succeeded += 1
+                        progress.update(
+                            True, f"{label} {describe(item)}: {result}" if verbose else None
+                        )
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            progress.finish()
+            raise
+    progress.finish()
+
+    elapsed = progress.elapsed()
+    rate_done = (succeeded + len(failures)) / elapsed if elapsed > 0 else 0
+    print(
+        f"{label}: {succeeded} succeeded, {len(failures)} failed "
+        f"in {elapsed:.1f}s ({rate_done:.1f}/s)"
+    )
+    if failures:
+        print("Failures:")
+        for item, error in failures:
+            print(f"  {describe(item)}: {error}")
+    return succeeded, failures
+
+
+def add_bulk_arguments(parser):
+    """Add the shared bulk execution options to an argparse parser"""
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of API calls to run concurrently for bulk actions (default: 1)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        help="Max API calls per second for bulk actions (default: unlimited)",
+    )
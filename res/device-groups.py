@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 
-import requests
 import argparse
+import csv
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+import api_client
+import bulk
+import inventory_cache
 
 
 def check_response(response):
@@ -37,32 +42,15 @@ def headers_with(token):
 
 # ---------- Device Group APIs ----------
 
-def list_groups(url, token, name=None, page_size=50):
+def list_groups(url, token, name=None, page_size=None):
     headers = headers_with(token)
-    params = {"pageSize": page_size}
+    params = {}
     if name:
         params["name"] = name
-    data, current = [], 0
-    while True:
-        current += 1
-        params["current"] = current
-        r = requests.get(f"{url}/api/device-groups", headers=headers, params=params)
-        if r.status_code != 200:
-            print(f"Error: HTTP {r.status_code} - {r.text}")
-            exit(1)
-        res = r.json()
-        if "error" in res:
-            print(f"Error: {res['error']}")
-            exit(1)
-        rows = res.get("data", [])
-        data.extend(rows)
-        total = res.get("total", 0)
-        if len(rows) < page_size or current * page_size >= total:
-            break
-    return data
+    return api_client.fetch_pages(f"{url}/api/device-groups", headers, params, page_size)
 
 
-def get_group_by_name(url, token, name):
+def find_group_by_name(url, token, name):
     groups = list_groups(url, token, name)
     for g in groups:
         if str(g.get("name")) == name:
@@ -70,6 +58,13 @@ def get_group_by_name(url, token, name):
     return None
 
 
+def get_group_by_name(url, token, name):
+    return inventory_cache.lookup(
+        url, inventory_cache.DEVICE_GROUP, name,
+        lambda key: find_group_by_name(url, token, key), "name"
+    )
+
+
 def create_group(url, token, name, note=None, accessed_from=None):
     headers = headers_with(token)
     payload = {"name": name}
@@ -77,7 +72,7 @@ def create_group(url, token, name, note=None, accessed_from=None):
         payload["note"] = note
     if accessed_from:
         payload["allowed_incomings"] = accessed_from
-    r = requests.post(f"{url}/api/device-groups", headers=headers, json=payload)
+    r = api_client.post(f"{url}/api/device-groups", headers=headers, json=payload)
     return check_response(r)
 
 
@@ -95,8 +90,9 @@ def update_group(url, token, name, new_name=None, note=None, accessed_from=None)
         payload["note"] = note
     if accessed_from is not None:
         payload["allowed_incomings"] = accessed_from
-    r = requests.patch(f"{url}/api/device-groups/{guid}", headers=headers, json=payload)
+    r = api_client.patch(f"{url}/api/device-groups/{guid}", headers=headers, json=payload)
     check_response(r)
+    inventory_cache.forget(url, inventory_cache.DEVICE_GROUP, name)
     return "Success"
 
 
@@ -110,15 +106,16 @@ def delete_groups(url, token, names):
             print(f"Error: Group '{n}' not found")
             exit(1)
         guid = g.get("guid")
-        r = requests.delete(f"{url}/api/device-groups/{guid}", headers=headers)
+        r = api_client.delete(f"{url}/api/device-groups/{guid}", headers=headers)
         check_response(r)
+        inventory_cache.forget(url, inventory_cache.DEVICE_GROUP, n)
     return "Success"
 
 
 # ---------- Device group assign APIs (name -> guid) ----------
 
 def view_devices(url, token, group_name=None, id=None, device_name=None, 
-                 user_name=None, device_username=None, page_size=50):
+                 user_name=None, device_username=None, page_size=None):
     """View devices in a device group with filters"""
     headers = headers_with(token)
     
@@ -140,22 +137,7 @@ def view_devices(url, token, group_name=None, id=None, device_name=None,
         if v is not None:
             params[k] = "%" + v + "%" if (v != "-" and "%" not in v) else v
     
-    params["pageSize"] = page_size
-    
-    data, current = [], 0
-    while True:
-        current += 1
-        params["current"] = current
-        r = requests.get(f"{url}/api/devices", headers=headers, params=params)
-        if r.status_code != 200:
-            return check_response(r)
-        res = r.json()
-        rows = res.get("data", [])
-        data.extend(rows)
-        total = res.get("total", 0)
-        if len(rows) < page_size or current * page_size >= total:
-            break
-    return data
+    return api_client.fetch_pages(f"{url}/api/devices", headers, params, page_size)
 
 
 def add_devices(url, token, group_name, device_ids):
@@ -165,7 +147,7 @@ def add_devices(url, token, group_name, device_ids):
         return f"Group '{group_name}' not found"
     guid = g.get("guid")
     payload = device_ids if isinstance(device_ids, list) else [device_ids]
-    r = requests.post(f"{url}/api/device-groups/{guid}", headers=headers, json=payload)
+    r = api_client.post(f"{url}/api/device-groups/{guid}", headers=headers, json=payload, idempotent=True)
     return check_response(r)
 
 
@@ -176,10 +158,122 @@ def remove_devices(url, token, group_name, device_ids):
         return f"Group '{group_name}' not found"
     guid = g.get("guid")
     payload = device_ids if isinstance(device_ids, list) else [device_ids]
-    r = requests.delete(f"{url}/api/device-groups/{guid}/devices", headers=headers, json=payload)
+    r = api_client.delete(f"{url}/api/device-groups/{guid}/devices", headers=headers, json=payload)
     return check_response(r)
 
 
+# ---------- Membership reconciliation ----------
+
+def load_membership(path):
+    """
+    Read the desired device IDs per group:
+      - JSON or YAML (.yaml/.yml): {"group name": ["device id", ...], ...}
+      - CSV (.csv) with "group" and "id" columns, e.g. a CMDB export
+    A group with an empty list is emptied; groups not in the file are left alone.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            desired = {}
+            for row in csv.DictReader(f):
+                if row.get("group") and row.get("id"):
+                    desired.setdefault(row["group"].strip(), []).append(row["id"].strip())
+            return desired
+        text = f.read()
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            print("Error: PyYAML is required for YAML files (pip install pyyaml), or use JSON")
+            exit(1)
+        desired = yaml.safe_load(text) or {}
+    else:
+        desired = json.loads(text)
+    if not isinstance(desired, dict):
+        print(f"Error: {path} must map group names to lists of device IDs")
+        exit(1)
+    return {str(name): [str(i) for i in ids or []] for name, ids in desired.items()}
+
+
+def current_members(url, token, group_names, parallel=1):
+    """Device IDs currently in each group; one listing per group, run concurrently"""
+    parallel = max(1, parallel)
+    api_client.ensure_pool_size(parallel)
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        listings = executor.map(lambda name: view_devices(url, token, group_name=name), group_names)
+        return {
+            name: {str(device["id"]) for device in devices}
+            for name, devices in zip(group_names, listings)
+        }
+
+
+def reconcile(url, token, desired, chunk_size=500, concurrency=1, rate=None, dry_run=False):
+    """
+    Make each group in `desired` (name -> device IDs) contain exactly those
+    devices. Current members are listed once per group; only the
+    differences are sent, in chunks of `chunk_size` IDs, concurrently across
+    groups. A device belongs to one group and adding it moves it, so all
+    removals run before the additions and cannot undo a move.
+
+    Returns the number of failed calls.
+    """
+    owner = {}
+    for name, ids in desired.items():
+        for device_id in ids:
+            if owner.setdefault(device_id, name) != name:
+                print(f"Error: device {device_id} is listed for groups '{owner[device_id]}' and '{name}'")
+                exit(1)
+
+    groups = {name: get_group_by_name(url, token, name) for name in desired}
+    missing = [name for name, group in groups.items() if not group]
+    if missing:
+        print(f"Error: Group(s) not found: {', '.join(missing)}")
+        exit(1)
+
+    current = current_members(url, token, list(desired), concurrency)
+    removals, additions = [], []
+    for name, ids in desired.items():
+        wanted = set(ids)
+        to_add = [i for i in dict.fromkeys(ids) if i not in current[name]]
+        to_remove = sorted(current[name] - wanted)
+        print(f"{name}: +{len(to_add)} -{len(to_remove)} ({len(current[name] & wanted)} unchanged)")
+        if dry_run:
+            for device_id in to_add:
+                print(f"  + {device_id}")
+            for device_id in to_remove:
+                print(f"  - {device_id}")
+        guid = groups[name]["guid"]
+        for start in range(0, len(to_remove), chunk_size):
+            removals.append((name, guid, to_remove[start:start + chunk_size]))
+        for start in range(0, len(to_add), chunk_size):
+            additions.append((name, guid, to_add[start:start + chunk_size]))
+    if dry_run:
+        return 0
+
+    headers = headers_with(token)
+
+    def remove(change):
+        _, guid, ids = change
+        r = api_client.delete(f"{url}/api/device-groups/{guid}/devices", headers=headers, json=ids)
+        api_client.parse_response(r)
+        return f"{len(ids)} device(s)"
+
+    def add(change):
+        _, guid, ids = change
+        r = api_client.post(f"{url}/api/device-groups/{guid}", headers=headers, json=ids, idempotent=True)
+        api_client.parse_response(r)
+        return f"{len(ids)} device(s)"
+
+    failed = 0
+    for action, changes, label in ((remove, removals, "Remove"), (add, additions, "Add")):
+        if changes:
+            _, failures = bulk.run_bulk(
+                action, changes, concurrency=concurrency, rate=rate, label=label,
+                describe=lambda change: change[0],
+            )
+            failed += len(failures)
+    return failed
+
+
 def parse_rules(s):
     if not s:
         return None
@@ -193,14 +287,15 @@ def parse_rules(s):
     return None
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Device Group manager")
     parser.add_argument("command", choices=[
         "view", "add", "update", "delete",
-        "view-devices", "add-devices", "remove-devices"
+        "view-devices", "add-devices", "remove-devices", "reconcile"
     ], help=(
         "Command to execute. "
         "[view/add/update/delete/add-devices/remove-devices: require Device Group Permission] "
+        "[reconcile: requires both] "
         "[view-devices: require Device Permission]"
     ))
     parser.add_argument("--url", required=True)
@@ -213,6 +308,20 @@ def main():
     parser.add_argument("--accessed-from", help="JSON array: '[{\"type\":0|2,\"name\":\"...\"}]' (0=User Group, 2=User)")
 
     parser.add_argument("--ids", help="Comma separated device IDs for add-devices/remove-devices")
+    parser.add_argument(
+        "--file",
+        help="Desired members per group for reconcile: JSON/YAML {group: [device ids]} "
+        "or CSV with group,id columns",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=500,
+        help="Device IDs per add/remove call for reconcile (default: 500)",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Show what reconcile would change without changing it"
+    )
     
     # Filters for view-devices command
     parser.add_argument("--id", help="Device ID filter (for view-devices)")
@@ -220,7 +329,13 @@ def main():
     parser.add_argument("--user-name", help="User name filter (owner of device, for view-devices)")
     parser.add_argument("--device-username", help="Device username filter (logged in user on device, for view-devices)")
 
-    args = parser.parse_args()
+    bulk.add_bulk_arguments(parser)
+    inventory_cache.add_cache_arguments(parser)
+    api_client.add_client_arguments(parser)
+
+    args = parser.parse_args(argv)
+    api_client.configure_from_args(args)
+    inventory_cache.configure_from_args(args)
     while args.url.endswith("/"): args.url = args.url[:-1]
 
     if args.command == "view":
@@ -268,6 +383,16 @@ def main():
             print(add_devices(args.url, args.token, args.name, ids))
         else:
             print(remove_devices(args.url, args.token, args.name, ids))
+    elif args.command == "reconcile":
+        if not args.file:
+            print("Error: --file is required for reconcile")
+            exit(1)
+        failed = reconcile(
+            args.url, args.token, load_membership(args.file), max(1, args.chunk_size),
+            args.concurrency, args.rate, args.dry_run,
+        )
+        if failed:
+            exit(1)
 
 
 if __name__ == "__main__":
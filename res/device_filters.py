@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+"""
+Client-side device filters for devices.py.
+
+`compile_filter()` turns the filter options into one predicate that is applied
+to every listed device in a single pass. Everything that does not depend on
+the device (the offline cutoff, the version bound, the compiled regex) is
+computed once up front. `last_online` timestamps are compared as ISO strings
+against a precomputed cutoff, so the common case needs no datetime parsing.
+
+Run this file directly to benchmark against the previous per-device
+`strptime`/`utcnow` approach:
+
+    python3 device_filters.py [--count 100000]
+"""
+
+import argparse
+import operator
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+_VERSION_OPS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+    "==": operator.eq,
+    "=": operator.eq,
+}
+
+
+def device_field(device, name):
+    """Read a field from the device row or its nested "info" dict"""
+    value = device.get(name)
+    if value is None:
+        info = device.get("info")
+        if isinstance(info, dict):
+            value = info.get(name)
+    return value
+
+
+@lru_cache(maxsize=4096)
+def parse_version(version):
+    """"1.3.10" -> (1, 3, 10); non-numeric parts are ignored"""
+    return tuple(int(part) for part in re.findall(r"\d+", str(version)))
+
+
+def _iso_key(value):
+    """
+    Normalize a timestamp to "YYYY-MM-DDTHH:MM:SS" for string comparison.
+    Returns None for a missing value.
+    """
+    if not value:
+        return None
+    tail = value[19:]
+    if (
+        len(value) >= 19 and value[4] == "-" and value[7] == "-" and value[10] in "T "
+        and (not tail or (tail[0] == "." and tail[1:].isdigit()))
+    ):
+        # Naive UTC, optionally with fractional seconds
+        if value[10] == " ":
+            return value[:10] + "T" + value[11:19]
+        return value[:19]
+    # Unusual format, take the slow path
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def offline_predicate(offline_days, now=None):
+    """Devices whose last_online is at least `offline_days` days ago"""
+    if now is None:
+        now = datetime.utcnow()
+    cutoff = (now - timedelta(days=offline_days)).strftime("%Y-%m-%dT%H:%M:%S")
+
+    def predicate(device):
+        last_online = _iso_key(device.get("last_online"))
+        # Never seen online counts as offline
+        return last_online is None or last_online <= cutoff
+
+    return predicate
+
+
+def version_predicate(spec):
+    """
+    ">=1.3.0", "<1.2", "=1.3.1" compare versions numerically; a plain value
+    like "1.3" matches that version prefix.
+    """
+    for op in (">=", "<=", "==", ">", "<", "="):
+        if spec.startswith(op):
+            compare = _VERSION_OPS[op]
+            bound = parse_version(spec[len(op):])
+
+            def predicate(device):
+                version = device_field(device, "version")
+                return version is not None and compare(parse_version(version), bound)
+
+            return predicate
+
+    prefix = parse_version(spec)
+
+    def predicate(device):
+        version = device_field(device, "version")
+        return version is not None and parse_version(version)[: len(prefix)] == prefix
+
+    return predicate
+
+
+def os_predicate(os_name):
+    """Case-insensitive substring match on the device OS"""
+    needle = os_name.lower()
+
+    def predicate(device):
+        value = device_field(device, "os")
+        return value is not None and needle in str(value).lower()
+
+    return predicate
+
+
+def note_predicate(pattern):
+    """Regular expression search on the device note"""
+    search = re.compile(pattern).search
+
+    def predicate(device):
+        return search(device.get("note") or "") is not None
+
+    return predicate
+
+
+def compile_filter(offline_days=None, version=None, os_name=None, note_regex=None, now=None):
+    """
+    Combine the given filters into one predicate; None when nothing is set.
+    Cheap checks run first so the expensive ones see fewer devices.
+    """
+    predicates = []
+    if os_name:
+        predicates.append(os_predicate(os_name))
+    if offline_days is not None:
+        predicates.append(offline_predicate(offline_days, now))
+    if version:
+        predicates.append(version_predicate(version))
+    if note_regex:
+        predicates.append(note_predicate(note_regex))
+
+    if not predicates:
+        return None
+    if len(predicates) == 1:
+        return predicates[0]
+
+    def predicate(device):
+        for p in predicates:
+            if not p(device):
+                return False
+        return True
+
+    return predicate
+
+
+def _synthetic_devices(count):
+    now = datetime.utcnow()
+    oses = ["Windows 10", "Windows 11", "Linux / Ubuntu 22.04", "macOS 14.2", "Android 13"]
+    return [
+        {
+            "guid": f"{i:08x}-0000-0000-0000-000000000000",
+            "id": str(100000000 + i),
+            "last_online": (now - timedelta(minutes=i * 7)).strftime("%Y-%m-%dT%H:%M:%S.%f"),
+            "note": f"rack-{i % 40} floor-{i % 5}",
+            "info": {"os": oses[i % len(oses)], "version": f"1.{2 + i % 3}.{i % 12}"},
+        }
+        for i in range(count)
+    ]
+
+
+def _legacy_offline(devices, offline_days):
+    result = []
+    for device in devices:
+        last_online = datetime.strptime(
+            device["last_online"].split(".")[0], "%Y-%m-%dT%H:%M:%S"
+        )
+        if (datetime.utcnow() - last_online).days >= offline_days:
+            result.append(device)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark device filters")
+    parser.add_argument("--count", type=int, default=100000, help="Number of synthetic devices")
+    parser.add_argument("--offline_days", type=int, default=30, help="Offline days filter")
+    args = parser.parse_args()
+
+    devices = _synthetic_devices(args.count)
+
+    start = time.perf_counter()
+    legacy = _legacy_offline(devices, args.offline_days)
+    legacy_time = time.perf_counter() - start
+
+    predicate = compile_filter(offline_days=args.offline_days)
+    start = time.perf_counter()
+    compiled = [d for d in devices if predicate(d)]
+    compiled_time = time.perf_counter() - start
+
+    combined = compile_filter(
+        offline_days=args.offline_days, version=">=1.3", os_name="windows", note_regex=r"rack-1\d"
+    )
+    start = time.perf_counter()
+    matched = sum(1 for d in devices if combined(d))
+    combined_time = time.perf_counter() - start
+
+    print(f"devices:                  {args.count}")
+    print(f"strptime offline filter:  {legacy_time * 1000:.1f} ms ({len(legacy)} matched)")
+    print(f"compiled offline filter:  {compiled_time * 1000:.1f} ms ({len(compiled)} matched)")
+    print(f"compiled combined filter: {combined_time * 1000:.1f} ms ({matched} matched)")
+
+
+if __name__ == "__main__":
+    main()
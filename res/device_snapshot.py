@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+"""
+Device inventory snapshots for devices.py snapshot and diff.
+
+A snapshot is NDJSON with one device per line, sorted by guid. Each line
+starts with the guid and has the other fields in sorted key order, so
+the same device state always gives the same line:
+
+    {"guid":"...","device_group_name":"lab","id":"123456789",...}
+
+A ".gz" file name gzip-compresses the snapshot. Because both files are
+sorted, diff is a single merge pass over the two files. Unchanged devices
+are recognized by comparing raw lines, without parsing them.
+"""
+
+import gzip
+import io
+import json
+import os
+import sys
+
+GUID_PREFIX = '{"guid":"'
+
+
+def device_line(device):
+    """The snapshot line of a device, guid first, without the newline"""
+    fields = {"guid": device.get("guid")}
+    fields.update(sorted((k, v) for k, v in device.items() if k != "guid"))
+    return json.dumps(fields, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_snapshot(devices, path):
+    """
+    Write devices sorted by guid; returns the number written. A device
+    listed twice (offset pagination over a changing fleet) is written once,
+    as last listed; devices without a guid cannot be compared and are left out.
+    """
+    # Serialized right away: short strings take far less memory than dicts
+    by_guid = {}
+    no_guid = 0
+    for device in devices:
+        if device.get("guid"):
+            by_guid[device["guid"]] = device_line(device)
+        else:
+            no_guid += 1
+    if no_guid:
+        print(f"Warning: left out {no_guid} device(s) without a guid", file=sys.stderr)
+    lines = sorted(by_guid.items())
+    if path == "-":
+        for _, line in lines:
+            sys.stdout.write(line + "\n")
+        return len(lines)
+
+    tmp = path + ".tmp"
+    raw = open(tmp, "wb")
+    stream = gzip.GzipFile(fileobj=raw, mode="wb") if path.endswith(".gz") else raw
+    with io.TextIOWrapper(stream, encoding="utf-8", newline="\n") as f:
+        for _, line in lines:
+            f.write(line + "\n")
+    if stream is not raw:
+        raw.close()
+    os.replace(tmp, path)
+    return len(lines)
+
+
+def _guid(line):
+    if line.startswith(GUID_PREFIX):
+        return line[len(GUID_PREFIX):line.index('"', len(GUID_PREFIX))]
+    return json.loads(line).get("guid") or ""
+
+
+def iter_snapshot(path):
+    """Yield (guid, line) of a snapshot file in order, checking the sort order"""
+    opener = gzip.open if path.endswith(".gz") else open
+    previous = None
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            guid = _guid(line)
+            if guid == previous:
+                print(f"Error: {path} lists guid {guid} more than once")
+                exit(1)
+            if previous is not None and guid < previous:
+                print(f"Error: {path} is not sorted by guid; write it with devices.py snapshot")
+                exit(1)
+            previous = guid
+            yield guid, line
+
+
+def _flatten(device, prefix=""):
+    """Nested objects (e.g. info) become dotted fields: info.os"""
+    fields = {}
+    for key, value in device.items():
+        if isinstance(value, dict):
+            fields.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            fields[prefix + key] = value
+    return fields
+
+
+def changed_fields(old, new, ignore=()):
+    """{field: [old value, new value]} of the fields that differ"""
+    old, new = _flatten(old), _flatten(new)
+    return {
+        field: [old.get(field), new.get(field)]
+        for field in sorted(old.keys() | new.keys())
+        if field not in ignore and old.get(field) != new.get(field)
+    }
+
+
+def diff_snapshots(old_path, new_path, ignore=()):
+    """
+    Merge-join two snapshots by guid. Yields ("added", device, None),
+    ("removed", device, None) and ("changed", new device, fields), and
+    returns the number of unchanged devices. Devices whose only changes are
+    in `ignore` count as unchanged.
+    """
+    old_rows, new_rows = iter_snapshot(old_path), iter_snapshot(new_path)
+    old, new = next(old_rows, None), next(new_rows, None)
+    unchanged = 0
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield "removed", json.loads(old[1]), None
+            old = next(old_rows, None)
+        elif old is None or new[0] < old[0]:
+            yield "added", json.loads(new[1]), None
+            new = next(new_rows, None)
+        else:
+            if old[1] == new[1]:
+                unchanged += 1
+            else:
+                device = json.loads(new[1])
+                fields = changed_fields(json.loads(old[1]), device, ignore)
+                if fields:
+                    yield "changed", device, fields
+                else:
+                    unchanged += 1
+            old, new = next(old_rows, None), next(new_rows, None)
+    return unchanged
@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 
-import requests
 import argparse
-from datetime import datetime, timedelta
+import json
+import os
+import sys
 
+import api_client
+import bulk
+import device_filters
+import device_snapshot
+import inventory_cache
 
-def view(
+
+def iter_devices(
     url,
     token,
     id=None,
@@ -14,9 +21,12 @@ def view(
     group_name=None,
     device_group_name=None,
     offline_days=None,
+    parallel=1,
+    version=None,
+    os_name=None,
+    note_regex=None,
 ):
     headers = {"Authorization": f"Bearer {token}"}
-    pageSize = 30
     params = {
         "id": id,
         "device_name": device_name,
@@ -30,112 +40,151 @@ def view(
         for k, v in params.items()
         if v is not None
     }
-    params["pageSize"] = pageSize
-
-    devices = []
-
-    current = 0
-
-    while True:
-        current += 1
-        params["current"] = current
-        response = requests.get(f"{url}/api/devices", headers=headers, params=params)
-        if response.status_code != 200:
-            print(f"Error: HTTP {response.status_code} - {response.text}")
-            exit(1)
-        
-        response_json = response.json()
-        if "error" in response_json:
-            print(f"Error: {response_json['error']}")
-            exit(1)
-
-        data = response_json.get("data", [])
-
-        for device in data:
-            if offline_days is None:
-                devices.append(device)
-                continue
-            last_online = datetime.strptime(
-                device["last_online"].split(".")[0], "%Y-%m-%dT%H:%M:%S"
-            )  # assuming date is in this format
-            if (datetime.utcnow() - last_online).days >= offline_days:
-                devices.append(device)
-
-        total = response_json.get("total", 0)
-        if len(data) < pageSize or current * pageSize >= total:
-            break
+    data = api_client.iter_pages(
+        f"{url}/api/devices", headers, params, parallel=parallel
+    )
+    # Every listing refreshes the cached id -> guid entries it sees
+    data = inventory_cache.store_iter(url, inventory_cache.DEVICE, data, "id")
 
-    return devices
+    predicate = device_filters.compile_filter(
+        offline_days=offline_days,
+        version=version,
+        os_name=os_name,
+        note_regex=note_regex,
+    )
+    if predicate is None:
+        yield from data
+    else:
+        yield from filter(predicate, data)
 
 
-def check(response):
-    if response.status_code != 200:
-        print(f"Error: HTTP {response.status_code} - {response.text}")
-        exit(1)
-    
-    try:
-        response_json = response.json()
-        if "error" in response_json:
-            print(f"Error: {response_json['error']}")
-            exit(1)
-        return response_json
-    except ValueError:
-        return response.text or "Success"
+def view(
+    url,
+    token,
+    id=None,
+    device_name=None,
+    user_name=None,
+    group_name=None,
+    device_group_name=None,
+    offline_days=None,
+    parallel=1,
+    version=None,
+    os_name=None,
+    note_regex=None,
+):
+    return list(
+        iter_devices(
+            url,
+            token,
+            id,
+            device_name,
+            user_name,
+            group_name,
+            device_group_name,
+            offline_days,
+            parallel,
+            version,
+            os_name,
+            note_regex,
+        )
+    )
 
 
 def disable(url, token, guid, id):
-    print("Disable", id)
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.post(f"{url}/api/devices/{guid}/disable", headers=headers)
-    return check(response)
+    response = api_client.post(f"{url}/api/devices/{guid}/disable", headers=headers, idempotent=True)
+    return api_client.parse_response(response)
 
 
 def enable(url, token, guid, id):
-    print("Enable", id)
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.post(f"{url}/api/devices/{guid}/enable", headers=headers)
-    return check(response)
+    response = api_client.post(f"{url}/api/devices/{guid}/enable", headers=headers, idempotent=True)
+    return api_client.parse_response(response)
 
 
 def delete(url, token, guid, id):
-    print("Delete", id)
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.delete(f"{url}/api/devices/{guid}", headers=headers)
-    return check(response)
+    response = api_client.delete(f"{url}/api/devices/{guid}", headers=headers)
+    result = api_client.parse_response(response)
+    inventory_cache.forget(url, inventory_cache.DEVICE, id)
+    return result
+
+
+ASSIGN_TYPES = [
+    "ab",
+    "strategy_name",
+    "user_name",
+    "device_group_name",
+    "note",
+    "device_username",
+    "device_name",
+]
 
 
 def assign(url, token, guid, id, type, value):
-    print("assign", id, type, value)
-    valid_types = [
-        "ab",
-        "strategy_name",
-        "user_name",
-        "device_group_name",
-        "note",
-        "device_username",
-        "device_name",
-    ]
-    if type not in valid_types:
-        print(f"Invalid type, it must be one of: {', '.join(valid_types)}")
-        return
+    if type not in ASSIGN_TYPES:
+        raise ValueError(f"Invalid type, it must be one of: {', '.join(ASSIGN_TYPES)}")
     data = {"type": type, "value": value}
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.post(
-        f"{url}/api/devices/{guid}/assign", headers=headers, json=data
+    response = api_client.post(
+        f"{url}/api/devices/{guid}/assign", headers=headers, json=data, idempotent=True
+    )
+    return api_client.parse_response(response)
+
+
+def print_diff(old_path, new_path, ignore=(), output="text"):
+    """Print the differences between two snapshots and a summary"""
+    counts = {"added": 0, "removed": 0, "changed": 0}
+    per_field = {}
+    changes = device_snapshot.diff_snapshots(old_path, new_path, set(ignore))
+    while True:
+        try:
+            change, device, fields = next(changes)
+        except StopIteration as stop:
+            unchanged = stop.value
+            break
+        counts[change] += 1
+        for field in fields or ():
+            per_field[field] = per_field.get(field, 0) + 1
+        if output == "ndjson":
+            row = {"change": change, "guid": device.get("guid"), "id": device.get("id")}
+            if fields is None:
+                row["device"] = device
+            else:
+                row["fields"] = fields
+            sys.stdout.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+            continue
+        name = f"{device.get('id')} {device.get('device_name') or ''}".rstrip()
+        if change == "added":
+            print(f"+ {name}")
+        elif change == "removed":
+            print(f"- {name}")
+        else:
+            details = "; ".join(f"{field}: {old!r} -> {new!r}" for field, (old, new) in fields.items())
+            print(f"~ {name}: {details}")
+
+    summary = (
+        f"Added: {counts['added']}, removed: {counts['removed']}, "
+        f"changed: {counts['changed']}, unchanged: {unchanged}"
     )
-    return check(response)
+    fields = ", ".join(f"{field} {n}" for field, n in sorted(per_field.items(), key=lambda item: -item[1]))
+    # Keep stdout pure NDJSON
+    stream = sys.stderr if output == "ndjson" else sys.stdout
+    print(summary, file=stream)
+    if fields:
+        print(f"Changed fields: {fields}", file=stream)
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Device manager")
     parser.add_argument(
         "command",
-        choices=["view", "disable", "enable", "delete", "assign"],
+        choices=["view", "disable", "enable", "delete", "assign", "snapshot", "diff"],
         help="Command to execute",
     )
-    parser.add_argument("--url", required=True, help="URL of the API")
+    parser.add_argument("--url", help="URL of the API")
     parser.add_argument(
-        "--token", required=True, help="Bearer token for authentication"
+        "--token", help="Bearer token for authentication"
     )
     parser.add_argument("--id", help="Device ID")
     parser.add_argument("--device_name", help="Device name")
@@ -149,12 +198,58 @@ def main():
     parser.add_argument(
         "--offline_days", type=int, help="Offline duration in days, e.g., 7"
     )
+    parser.add_argument(
+        "--version",
+        help="Client version filter, e.g. 1.3 (prefix), >=1.3.0, <1.2",
+    )
+    parser.add_argument("--os", help="OS filter (case-insensitive substring), e.g. windows")
+    parser.add_argument("--note_regex", help="Regular expression matched against the device note")
+    parser.add_argument("--yes", action="store_true", help="Do not ask for confirmation when several devices match")
+
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        help="Number of device list pages to fetch concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--output",
+        choices=["text", "ndjson"],
+        default="text",
+        help="Output format for view and diff; ndjson writes one JSON object per line",
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="append",
+        metavar="FILE",
+        help="Snapshot file to write (snapshot), or give it twice, old then new (diff); "
+        "a .gz name is compressed",
+    )
+    parser.add_argument(
+        "--ignore",
+        action="append",
+        default=[],
+        metavar="FIELD",
+        help="Field to leave out of diff, e.g. last_online or info.version (repeatable)",
+    )
+    bulk.add_bulk_arguments(parser)
+    inventory_cache.add_cache_arguments(parser)
+    api_client.add_client_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.command == "diff":
+        if not args.snapshot or len(args.snapshot) != 2:
+            parser.error("diff needs --snapshot OLD --snapshot NEW")
+        print_diff(args.snapshot[0], args.snapshot[1], args.ignore, args.output)
+        return
+    if not (args.url and args.token):
+        parser.error("--url and --token are required")
+    api_client.configure_from_args(args)
+    inventory_cache.configure_from_args(args)
     
     while args.url.endswith("/"): args.url = args.url[:-1]
 
-    devices = view(
+    devices = iter_devices(
         args.url,
         args.token,
         args.id,
@@ -163,14 +258,42 @@ def main():
         args.group_name,
         args.device_group_name,
         args.offline_days,
+        args.parallel,
+        args.version,
+        args.os,
+        args.note_regex,
     )
 
-    if args.command == "view":
-        for device in devices:
-            print(device)
+    if args.command == "snapshot":
+        if not args.snapshot or len(args.snapshot) != 1:
+            parser.error("snapshot needs --snapshot FILE")
+        count = device_snapshot.write_snapshot(devices, args.snapshot[0])
+        if args.snapshot[0] != "-":
+            print(f"Wrote {count} devices to {args.snapshot[0]}")
+    elif args.command == "view":
+        try:
+            for device in devices:
+                if args.output == "ndjson":
+                    sys.stdout.write(json.dumps(device, separators=(",", ":")) + "\n")
+                    sys.stdout.flush()
+                else:
+                    print(device)
+        except BrokenPipeError:
+            # Output closed early, e.g. piped into head
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
     elif args.command in ["disable", "enable", "delete", "assign"]:
+        if args.command == "assign":
+            if not args.assign_to or "=" not in args.assign_to:
+                print("Invalid assign_to format, it must be <type>=<value>")
+                return
+            type, value = args.assign_to.split("=", 1)
+            if type not in ASSIGN_TYPES:
+                print(f"Invalid type, it must be one of: {', '.join(ASSIGN_TYPES)}")
+                return
+
+        devices = list(devices)
         # Check if we need user confirmation for multiple devices
-        if len(devices) > 1:
+        if len(devices) > 1 and not args.yes:
             print(f"Found {len(devices)} devices. Do you want to proceed with {args.command} operation on the devices? (Y/N)")
             confirmation = input("Type 'Y' to confirm: ").strip()
             if confirmation.upper() != 'Y':
@@ -178,27 +301,26 @@ def main():
                 return
         
         if args.command == "disable":
-            for device in devices:
-                response = disable(args.url, args.token, device["guid"], device["id"])
-                print(response)
+            action = lambda device: disable(args.url, args.token, device["guid"], device["id"])
         elif args.command == "enable":
-            for device in devices:
-                response = enable(args.url, args.token, device["guid"], device["id"])
-                print(response)
+            action = lambda device: enable(args.url, args.token, device["guid"], device["id"])
         elif args.command == "delete":
-            for device in devices:
-                response = delete(args.url, args.token, device["guid"], device["id"])
-                print(response)
+            action = lambda device: delete(args.url, args.token, device["guid"], device["id"])
         elif args.command == "assign":
-            if "=" not in args.assign_to:
-                print("Invalid assign_to format, it must be <type>=<value>")
-                return
-            type, value = args.assign_to.split("=", 1)
-            for device in devices:
-                response = assign(
-                    args.url, args.token, device["guid"], device["id"], type, value
-                )
-                print(response)
+            action = lambda device: assign(
+                args.url, args.token, device["guid"], device["id"], type, value
+            )
+
+        _, failures = bulk.run_bulk(
+            action,
+            devices,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            label=args.command.capitalize(),
+            describe=lambda device: device["id"],
+        )
+        if failures:
+            exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+"""
+Local on-disk cache of console inventory (devices, users, groups, strategies)
+used by the admin scripts to resolve IDs and names to GUIDs.
+
+Entries live in a SQLite file under ~/.cache/mdesk (or $XDG_CACHE_HOME/mdesk,
+or $MDESK_CACHE_DIR) keyed by server URL, kind and lookup key. A lookup is
+served from the cache while the entry is younger than the TTL; missing or
+stale entries are fetched from the API one by one and written back, so a
+repeated command only hits the API for what changed. Listings that already
+download entities (e.g. devices.py view) store what they see as well.
+
+    MDESK_CACHE_TTL   seconds an entry stays fresh (default: 3600)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_TTL = float(os.getenv("MDESK_CACHE_TTL") or "3600")
+
+DEVICE = "device"
+USER = "user"
+DEVICE_GROUP = "device_group"
+USER_GROUP = "user_group"
+STRATEGY = "strategy"
+
+_enabled = True
+_ttl = DEFAULT_TTL
+_refresh = False
+_path = None
+_conn = None
+_lock = threading.Lock()
+
+
+def default_path():
+    cache_dir = os.getenv("MDESK_CACHE_DIR")
+    if not cache_dir:
+        base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        cache_dir = os.path.join(base, "mdesk")
+    return os.path.join(cache_dir, "inventory.sqlite3")
+
+
+def configure(enabled=None, ttl=None, refresh=None, path=None):
+    """Change cache settings; `refresh` ignores cached entries for this run"""
+    global _enabled, _ttl, _refresh, _path, _conn
+    with _lock:
+        if enabled is not None:
+            _enabled = enabled
+        if ttl is not None:
+            _ttl = ttl
+        if refresh is not None:
+            _refresh = refresh
+        if path is not None and path != _path:
+            _path = path
+            if _conn is not None:
+                _conn.close()
+                _conn = None
+
+
+def _connect():
+    global _conn
+    if _conn is None:
+        path = _path or default_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entities ("
+            " server TEXT NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL,"
+            " guid TEXT, data TEXT NOT NULL, fetched_at REAL NOT NULL,"
+            " PRIMARY KEY (server, kind, key))"
+        )
+        _conn = conn
+    return _conn
+
+
+def get(server, kind, key):
+    """Return the cached row for `key` if present and fresh, else None"""
+    if not _enabled or _refresh:
+        return None
+    with _lock:
+        row = _connect().execute(
+            "SELECT data, fetched_at FROM entities WHERE server=? AND kind=? AND key=?",
+            (server, kind, key),
+        ).fetchone()
+    if row is None or time.time() - row[1] > _ttl:
+        return None
+    return json.loads(row[0])
+
+
+def store(server, kind, rows, key_field):
+    """Insert or refresh rows, keyed by `row[key_field]`"""
+    if not _enabled:
+        return
+    now = time.time()
+    values = [
+        (server, kind, str(row[key_field]), row.get("guid"), json.dumps(row), now)
+        for row in rows
+        if row.get(key_field) is not None
+    ]
+    if not values:
+        return
+    with _lock:
+        conn = _connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO entities"
+                " (server, kind, key, guid, data, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                values,
+            )
+
+
+def forget(server, kind, key):
+    """Drop one entry, e.g. after the API rejected its cached GUID"""
+    if not _enabled:
+        return
+    with _lock:
+        conn = _connect()
+        with conn:
+            conn.execute(
+                "DELETE FROM entities WHERE server=? AND kind=? AND key=?",
+                (server, kind, key),
+            )
+
+
+def lookup(server, kind, key, fetch, key_field):
+    """
+    Resolve `key` from the cache, falling back to `fetch(key)` which returns
+    the matching row dict or None. Fetched rows are written back.
+    """
+    row = get(server, kind, key)
+    if row is not None:
+        return row
+    row = fetch(key)
+    if row is not None:
+        store(server, kind, [row], key_field)
+    return row
+
+
+def store_iter(server, kind, rows, key_field, batch=500):
+    """Pass rows through unchanged while storing them in batches"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch:
+            store(server, kind, chunk, key_field)
+            chunk = []
+        yield row
+    store(server, kind, chunk, key_field)
+
+
+def add_cache_arguments(parser):
+    """Add the shared cache options to an argparse parser"""
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Do not use the local inventory cache"
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=DEFAULT_TTL,
+        help=f"Seconds a cached inventory entry stays fresh (default: {DEFAULT_TTL:g}, env MDESK_CACHE_TTL)",
+    )
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Ignore cached entries and re-fetch everything that is looked up",
+    )
+
+
+def configure_from_args(args):
+    """Apply the options added by `add_cache_arguments`"""
+    configure(enabled=not args.no_cache, ttl=args.cache_ttl, refresh=args.refresh_cache)
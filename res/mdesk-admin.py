@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+Single entry point for the console admin scripts:
+
+    mdesk-admin.py <area> <command> [options]
+    mdesk-admin.py devices view --device_group_name lab
+    mdesk-admin.py --profile prod audits export --type conn --output conn.ndjson
+    mdesk-admin.py run steps.yaml     (several operations in one process,
+                                       see batch_runner.py)
+
+Only the script of the requested area is imported, so a call costs one
+interpreter start and that script's imports instead of all of them.
+
+--url and --token default to the selected profile of the profile file
+(~/.config/mdesk/admin.ini, or $XDG_CONFIG_HOME/mdesk/admin.ini, or
+$MDESK_PROFILE_FILE):
+
+    [default]
+    url = https://console.example.com
+    token = ...
+
+    [prod]
+    url = https://console.prod.example.com
+    token = ...
+
+The profile is chosen with --profile or $MDESK_PROFILE (default: "default");
+$MDESK_URL and $MDESK_TOKEN override the profile values. Options given on
+the command line always win.
+"""
+
+import configparser
+import importlib.util
+import os
+import stat
+import sys
+import threading
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# area -> script file
+AREAS = {
+    "devices": "devices.py",
+    "users": "users.py",
+    "user-groups": "user-groups.py",
+    "device-groups": "device-groups.py",
+    "strategies": "strategies.py",
+    "ab": "ab.py",
+    "audits": "audits.py",
+}
+
+_load_lock = threading.Lock()
+
+
+def default_profile_file():
+    path = os.getenv("MDESK_PROFILE_FILE")
+    if path:
+        return path
+    base = os.getenv("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(base, "mdesk", "admin.ini")
+
+
+def load_profile(name=None, path=None):
+    """Return {"url", "token"} of a profile (missing keys omitted)"""
+    path = path or default_profile_file()
+    name = name or os.getenv("MDESK_PROFILE") or "default"
+    settings = {}
+    if os.path.exists(path):
+        mode = os.stat(path).st_mode
+        if mode & (stat.S_IRWXG | stat.S_IRWXO):
+            print(f"Warning: {path} holds API tokens but is readable by others (chmod 600 it)",
+                  file=sys.stderr)
+        config = configparser.ConfigParser()
+        config.read(path)
+        if config.has_section(name):
+            settings.update({k: v for k, v in config[name].items() if k in ("url", "token")})
+        elif name != "default" or os.getenv("MDESK_PROFILE"):
+            print(f"Error: profile '{name}' not found in {path}")
+            exit(1)
+    for key in ("url", "token"):
+        value = os.getenv(f"MDESK_{key.upper()}")
+        if value:
+            settings[key] = value
+    return settings
+
+
+def with_defaults(argv, settings):
+    """Append --url/--token from the profile unless given in argv"""
+    argv = list(argv)
+    if "-h" in argv or "--help" in argv:
+        return argv
+    for key, value in settings.items():
+        option = f"--{key}"
+        if not any(arg == option or arg.startswith(option + "=") for arg in argv):
+            argv += [option, value]
+    return argv
+
+
+def load_area(area):
+    """Import the script of an area by file name (some contain dashes)"""
+    path = os.path.join(HERE, AREAS[area])
+    module_name = "mdesk_" + area.replace("-", "_")
+    # Steps of a batch run load areas from several threads
+    with _load_lock:
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[module_name] = module
+        return module
+
+
+def usage():
+    print(__doc__.strip().split("\n\n")[1])
+    print("\nAreas: " + ", ".join(AREAS) + ", or run FILE")
+    print("Options: --profile NAME, --profile-file PATH")
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    profile = None
+    profile_file = None
+    # Own options come before the area
+    while argv and argv[0].startswith("--profile"):
+        option = argv.pop(0)
+        if "=" in option:
+            option, value = option.split("=", 1)
+        elif argv:
+            value = argv.pop(0)
+        else:
+            print(f"Error: {option} needs a value")
+            exit(2)
+        if option == "--profile":
+            profile = value
+        elif option == "--profile-file":
+            profile_file = value
+        else:
+            print(f"Error: unknown option {option}")
+            exit(2)
+
+    if not argv or argv[0] in ("-h", "--help"):
+        usage()
+        return
+    area = argv.pop(0)
+    settings = load_profile(profile, profile_file)
+    if area == "run":
+        import batch_runner
+
+        sys.argv[0] = f"{os.path.basename(sys.argv[0])} run"
+        batch_runner.main(
+            argv, AREAS, lambda step_area, args: load_area(step_area).main(with_defaults(args, settings))
+        )
+        return
+    if area not in AREAS:
+        print(f"Error: unknown area '{area}', choose from: {', '.join(AREAS)}")
+        exit(2)
+
+    module = load_area(area)
+    # argparse takes the program name shown in usage and errors from argv[0]
+    sys.argv[0] = f"{os.path.basename(sys.argv[0])} {area}"
+    module.main(with_defaults(argv, settings))
+
+
+if __name__ == "__main__":
+    main()
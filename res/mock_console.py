@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+
+"""
+Local stand-in for the console API, for measuring and regression-testing
+the admin scripts without a live console.
+
+Implements the endpoints the scripts use (devices, users, user and device
+groups, strategies, address books and audits) over a generated in-memory
+dataset. List endpoints follow the console conventions: `current` and
+`pageSize` params, `%` wildcards in string filters and `{"data", "total"}`
+responses. Any bearer token is accepted.
+
+    python3 mock_console.py --size 10000 --latency 0.005 --max-page-size 500
+
+Then point a script at it:
+
+    python3 devices.py view --url http://127.0.0.1:21114 --token x
+
+GET /__stats returns the request counts per endpoint, POST /__stats resets
+them. See benchmark.py for the benchmark suite built on this server.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+DEFAULT_PORT = 21114
+
+OSES = ["Windows 10", "Windows 11", "Linux / Ubuntu 22.04", "macOS 14.2", "Android 13"]
+
+# List endpoint -> {query parameter: row field}
+LIST_FILTERS = {
+    "devices": {
+        "id": "id",
+        "device_name": "device_name",
+        "user_name": "user_name",
+        "group_name": "group_name",
+        "device_group_name": "device_group_name",
+        "device_username": "device_username",
+    },
+    "users": {"name": "name", "group_name": "group_name"},
+    "user-groups": {"name": "name"},
+    "device-groups": {"name": "name"},
+    "ab/shared/profiles": {"name": "name"},
+    "ab/peers": {"ab": "ab", "id": "id", "alias": "alias"},
+    "ab/rules": {"ab": "ab"},
+    "audits/conn": {"remote": "remote", "conn_type": "conn_type"},
+    "audits/file": {"remote": "remote"},
+    "audits/alarm": {"device": "device"},
+    "audits/console": {"operator": "operator"},
+}
+
+
+def make_guid(kind, i):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"mdesk-mock/{kind}/{i}"))
+
+
+def _pattern(value):
+    """Console filter semantics: % is a wildcard, otherwise exact match"""
+    if "%" not in value:
+        # "-" matches an empty field
+        return lambda field: str(field) == value or (value == "-" and field in (None, ""))
+    regex = re.compile(
+        "^" + ".*".join(re.escape(part) for part in value.split("%")) + "$", re.IGNORECASE
+    )
+    return lambda field: field is not None and regex.match(str(field)) is not None
+
+
+def _parse_created_at(value):
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S.%f").replace(
+        tzinfo=timezone.utc
+    ).timestamp()
+
+
+class Dataset:
+    """Generated console state; all access under `lock`"""
+
+    def __init__(self, size=1000, audits=None, groups=10, address_books=5, peers=None):
+        self.lock = threading.Lock()
+        now = time.time()
+        user_count = max(1, size // 4)
+        self.user_groups = [
+            {"guid": make_guid("user-group", i), "name": f"ugroup{i}", "note": ""}
+            for i in range(groups)
+        ]
+        self.users = [
+            {
+                "guid": make_guid("user", i),
+                "name": f"user{i}",
+                "email": f"user{i}@example.com",
+                "group_name": f"ugroup{i % groups}",
+                "note": "",
+                "status": 1,
+            }
+            for i in range(user_count)
+        ]
+        self.device_groups = [
+            {"guid": make_guid("device-group", i), "name": f"dgroup{i}", "note": ""}
+            for i in range(groups)
+        ]
+        self.devices = [
+            {
+                "guid": make_guid("device", i),
+                "id": str(100000000 + i),
+                "device_name": f"host-{i}",
+                "user_name": f"user{i % user_count}",
+                "group_name": f"ugroup{i % groups}",
+                "device_group_name": f"dgroup{i % groups}",
+                "device_username": f"admin{i % 3}",
+                "status": 1,
+                "note": f"rack-{i % 40} floor-{i % 5}",
+                "last_online": datetime.fromtimestamp(
+                    now - (i % 1000) * 3600, timezone.utc
+                ).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3],
+                "info": {"os": OSES[i % len(OSES)], "version": f"1.{2 + i % 3}.{i % 12}"},
+            }
+            for i in range(size)
+        ]
+        self.strategies = [
+            {"guid": make_guid("strategy", i), "name": f"strategy{i}", "status": 1}
+            for i in range(10)
+        ]
+
+        peers = size if peers is None else peers
+        self.personal_ab = make_guid("ab", "personal")
+        self.abs = [
+            {"guid": make_guid("ab", i), "name": f"ab{i}", "owner": "user0", "note": ""}
+            for i in range(address_books)
+        ]
+        self.peers = {ab["guid"]: {} for ab in self.abs}
+        self.peers[self.personal_ab] = {}
+        self.tags = {guid: {} for guid in self.peers}
+        for i in range(peers):
+            ab = self.abs[i % address_books]["guid"]
+            tag = f"tag{i % 20}"
+            self.peers[ab][str(100000000 + i)] = {
+                "id": str(100000000 + i),
+                "alias": f"alias-{i}",
+                "note": "",
+                "tags": [tag],
+            }
+            self.tags[ab].setdefault(tag, 0xFF000000 + i % 20)
+        self.rules = {ab["guid"]: [] for ab in self.abs}
+
+        # Audits, created_at spread over the last 30 days, oldest first
+        count = size if audits is None else audits
+        step = 30 * 86400 / max(1, count)
+        start = now - 30 * 86400
+        self.audits = {
+            "conn": [
+                {
+                    "id": i,
+                    "remote": str(100000000 + i % max(1, size)),
+                    "conn_type": i % 5,
+                    "created_at": start + i * step,
+                    "end_time": start + i * step + 600,
+                }
+                for i in range(count)
+            ],
+            "file": [
+                {
+                    "id": i,
+                    "remote": str(100000000 + i % max(1, size)),
+                    "path": f"/home/user/file{i}.bin",
+                    "info": json.dumps({"files": [[f"file{i}.bin", 1024 * (i % 1000)]]}),
+                    "created_at": start + i * step,
+                }
+                for i in range(count // 4)
+            ],
+            "alarm": [
+                {
+                    "id": i,
+                    "device": str(100000000 + i % max(1, size)),
+                    "typ": i % 6,
+                    "created_at": start + i * step * 10,
+                }
+                for i in range(count // 10)
+            ],
+            "console": [
+                {
+                    "id": i,
+                    "operator": f"user{i % 10}",
+                    "typ": i % 4,
+                    "iop": i % 23,
+                    "created_at": start + i * step * 10,
+                }
+                for i in range(count // 10)
+            ],
+        }
+
+
+class MockConsole:
+    """
+    The server: a ThreadingHTTPServer over a Dataset.
+
+    latency        seconds added to every request
+    max_page_size  largest page returned, whatever pageSize asks for
+    audit_order    "desc" (newest first) or "asc"
+    until_param    query parameter accepted as upper created_at bound of
+                   audit lists, None to accept only the lower bound
+    error_rate     fraction of API requests answered with a transient
+                   502, or 503 with Retry-After, before doing anything
+    """
+
+    def __init__(self, dataset, host="127.0.0.1", port=DEFAULT_PORT, latency=0.0,
+                 max_page_size=1000, audit_order="desc", until_param=None, error_rate=0.0):
+        self.dataset = dataset
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.audit_order = audit_order
+        self.until_param = until_param
+        self.error_rate = error_rate
+        self.requests = Counter()
+        self.bytes_sent = 0
+        self.stats_lock = threading.Lock()
+        handler = type("Handler", (_Handler,), {"console": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve on a background thread"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.requests.clear()
+            self.bytes_sent = 0
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                "requests": sum(self.requests.values()),
+                "bytes": self.bytes_sent,
+                "endpoints": dict(self.requests.most_common()),
+            }
+
+
+def _endpoint(method, path):
+    """Request counter key with GUIDs and IDs replaced by placeholders"""
+    parts = [
+        "{id}" if (len(part) == 36 and part.count("-") == 4) or part.isdigit() else part
+        for part in path.split("/")
+    ]
+    return f"{method} {'/'.join(parts)}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    console = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with self.console.stats_lock:
+            self.console.bytes_sent += len(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return None
+        return json.loads(self.rfile.read(length))
+
+    def _dispatch(self, method):
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip("/")
+        query = dict(parse_qsl(parsed.query, keep_blank_values=True))
+        body = self._body()
+
+        if path == "/__stats":
+            if method == "GET":
+                return self._send(200, self.console.stats())
+            self.console.reset_stats()
+            return self._send(200, {})
+
+        with self.console.stats_lock:
+            self.console.requests[_endpoint(method, path)] += 1
+        if self.console.latency:
+            time.sleep(self.console.latency)
+        if not path.startswith("/api/"):
+            return self._send(404, {"error": "Not found"})
+        if self.console.error_rate and random.random() < self.console.error_rate:
+            if random.random() < 0.5:
+                return self._send(502, {"error": "Bad gateway"})
+            return self._send(503, {"error": "Overloaded"}, {"Retry-After": "1"})
+        if not (self.headers.get("Authorization") or "").startswith("Bearer "):
+            return self._send(401, {"error": "Unauthorized"})
+
+        try:
+            status, result = _route(self.console, method, path[len("/api/"):], query, body)
+        except (KeyError, ValueError, TypeError) as e:
+            status, result = 400, {"error": f"Bad request: {e}"}
+        self._send(status, result)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+def _page(console, rows, query, filters):
+    for param, value in query.items():
+        field = filters.get(param)
+        if field is not None:
+            match = _pattern(value)
+            rows = [row for row in rows if match(row.get(field))]
+    page_size = min(int(query.get("pageSize", 10)), console.max_page_size)
+    current = max(1, int(query.get("current", 1)))
+    start = (current - 1) * page_size
+    return 200, {"data": rows[start:start + page_size], "total": len(rows)}
+
+
+def _audits(console, audit_type, query):
+    rows = console.dataset.audits[audit_type]
+    if "created_at" in query:
+        low = _parse_created_at(query["created_at"])
+        rows = [row for row in rows if row["created_at"] >= low]
+    if console.until_param and console.until_param in query:
+        high = _parse_created_at(query[console.until_param])
+        rows = [row for row in rows if row["created_at"] < high]
+    if console.audit_order == "desc":
+        rows = rows[::-1]
+    return _page(console, rows, query, LIST_FILTERS[f"audits/{audit_type}"])
+
+
+def _by_guid(rows, guid):
+    for row in rows:
+        if row["guid"] == guid:
+            return row
+    raise KeyError(guid)
+
+
+def _route(console, method, path, query, body):
+    data = console.dataset
+    parts = path.split("/")
+    ok = (200, {})
+
+    with data.lock:
+        # ---------- Lists ----------
+        if method == "GET" and path in ("devices", "users", "user-groups", "device-groups"):
+            rows = {
+                "devices": data.devices,
+                "users": data.users,
+                "user-groups": data.user_groups,
+                "device-groups": data.device_groups,
+            }[path]
+            return _page(console, rows, query, LIST_FILTERS[path])
+        if method == "GET" and parts[0] == "audits" and len(parts) == 2:
+            return _audits(console, parts[1], query)
+
+        # ---------- Devices ----------
+        if parts[0] == "devices" and len(parts) >= 2:
+            device = _by_guid(data.devices, parts[1])
+            if method == "DELETE" and len(parts) == 2:
+                data.devices.remove(device)
+                return ok
+            if method == "POST" and parts[2:] == ["enable"]:
+                device["status"] = 1
+                return ok
+            if method == "POST" and parts[2:] == ["disable"]:
+                device["status"] = 0
+                return ok
+            if method == "POST" and parts[2:] == ["assign"]:
+                field = {"ab": "ab", "strategy": "strategy_name"}.get(body["type"], body["type"])
+                device[field] = body["value"]
+                return ok
+
+        # ---------- Users ----------
+        if path == "users" and method == "POST":
+            guid = make_guid("user", body["name"])
+            data.users.append(dict(body, guid=guid, status=1))
+            return 200, {"guid": guid}
+        if path in ("users/invite", "users/force-logout", "users/tfa/totp/enforce",
+                    "users/disable_login_verification"):
+            return ok
+        if parts[0] == "users" and len(parts) >= 2:
+            user = _by_guid(data.users, parts[1])
+            if method == "DELETE" and len(parts) == 2:
+                data.users.remove(user)
+                return ok
+            if method == "POST" and parts[2:] in (["enable"], ["disable"]):
+                user["status"] = 1 if parts[2] == "enable" else 0
+                return ok
+
+        # ---------- Groups ----------
+        for kind, rows, member_rows, member_field in (
+            ("user-groups", data.user_groups, data.users, "group_name"),
+            ("device-groups", data.device_groups, data.devices, "device_group_name"),
+        ):
+            if parts[0] != kind:
+                continue
+            if len(parts) == 1 and method == "POST":
+                guid = make_guid(kind, body["name"])
+                rows.append(dict(body, guid=guid))
+                return ok
+            group = _by_guid(rows, parts[1])
+            if len(parts) == 2 and method == "PATCH":
+                group.update(body)
+                return ok
+            if len(parts) == 2 and method == "DELETE":
+                rows.remove(group)
+                return ok
+            if len(parts) == 2 and method == "POST":
+                # Add members by GUID (users) or device ID (devices)
+                wanted = set(body)
+                for member in member_rows:
+                    if member["guid"] in wanted or member.get("id") in wanted:
+                        member[member_field] = group["name"]
+                return ok
+            if parts[2:] == ["devices"] and method == "DELETE":
+                wanted = set(body)
+                for member in member_rows:
+                    if member["guid"] in wanted or member.get("id") in wanted:
+                        if member.get(member_field) == group["name"]:
+                            member[member_field] = ""
+                return ok
+
+        # ---------- Strategies ----------
+        if path == "strategies" and method == "GET":
+            return 200, data.strategies
+        if path == "strategies/assign" and method == "POST":
+            return ok
+        if parts[0] == "strategies" and len(parts) >= 2:
+            strategy = _by_guid(data.strategies, parts[1])
+            if method == "GET" and len(parts) == 2:
+                return 200, strategy
+            if parts[2:] == ["status"] and method == "PUT":
+                strategy["status"] = 1 if body else 0
+                return ok
+
+        # ---------- Address books ----------
+        if parts[0] == "ab":
+            return _address_book(console, method, parts[1:], query, body)
+
+    return 404, {"error": f"No mock for {method} /api/{path}"}
+
+
+def _address_book(console, method, parts, query, body):
+    data = console.dataset
+    ok = (200, {})
+    if parts == ["personal"] and method in ("GET", "POST"):
+        return 200, {"guid": data.personal_ab}
+    if parts == ["shared", "profiles"] and method == "GET":
+        return _page(console, data.abs, query, LIST_FILTERS["ab/shared/profiles"])
+    if parts == ["shared", "add"] and method == "POST":
+        guid = make_guid("ab", body["name"])
+        data.abs.append(dict(body, guid=guid))
+        data.peers[guid], data.tags[guid], data.rules[guid] = {}, {}, []
+        return 200, {"guid": guid}
+    if parts == ["shared", "update", "profile"] and method == "PUT":
+        _by_guid(data.abs, body["guid"]).update(body)
+        return ok
+    if parts == ["shared"] and method == "DELETE":
+        data.abs = [ab for ab in data.abs if ab["guid"] not in set(body)]
+        return ok
+    if parts == ["peers"] and method == "GET":
+        rows = [dict(peer, ab=query.get("ab")) for peer in data.peers[query["ab"]].values()]
+        return _page(console, rows, query, LIST_FILTERS["ab/peers"])
+    if parts == ["rules"] and method == "GET":
+        return _page(console, data.rules.get(query.get("ab"), []), query, LIST_FILTERS["ab/rules"])
+    if parts == ["rule"] and method in ("POST", "PATCH", "DELETE"):
+        return ok
+    if len(parts) == 3 and parts[:2] == ["peer", "add"] and method == "POST":
+        peers = data.peers[parts[2]]
+        if body["id"] in peers:
+            return 200, {"error": "Peer already exists"}
+        peers[body["id"]] = body
+        return ok
+    if len(parts) == 3 and parts[:2] == ["peer", "update"] and method == "PUT":
+        peer = data.peers[parts[2]][body["id"]]
+        peer.update(body)
+        return ok
+    if len(parts) == 2 and parts[0] == "peer" and method == "DELETE":
+        peers = data.peers[parts[1]]
+        for peer_id in body:
+            peers.pop(peer_id, None)
+        return ok
+    if len(parts) == 2 and parts[0] == "tags" and method == "GET":
+        return 200, [
+            {"name": name, "color": color} for name, color in data.tags[parts[1]].items()
+        ]
+    if len(parts) == 3 and parts[:2] == ["tag", "add"] and method == "POST":
+        tags = data.tags[parts[2]]
+        if body["name"] in tags:
+            return 200, {"error": "Tag already exists"}
+        tags[body["name"]] = body.get("color", 0)
+        return ok
+    if len(parts) == 3 and parts[:2] == ["tag", "update"] and method == "PUT":
+        data.tags[parts[2]][body["name"]] = body.get("color", 0)
+        return ok
+    if len(parts) == 2 and parts[0] == "tag" and method == "DELETE":
+        tags = data.tags[parts[1]]
+        for name in body:
+            tags.pop(name, None)
+        return ok
+    return 404, {"error": f"No mock for {method} /api/ab/{'/'.join(parts)}"}
+
+
+def add_mock_arguments(parser):
+    """Options shared by this server and benchmark.py"""
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request (default: 0)")
+    parser.add_argument("--max-page-size", type=int, default=1000, help="Largest page the server returns (default: 1000)")
+    parser.add_argument("--audit-order", choices=["desc", "asc"], default="desc", help="Audit list order (default: desc, newest first)")
+    parser.add_argument("--until-param", help="Accept this query parameter as upper created_at bound of audit lists")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 502/503 (default: 0)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock console API server")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--size", type=int, default=1000, help="Number of devices; users, peers and audits scale with it (default: 1000)")
+    parser.add_argument("--audits", type=int, help="Number of connection audits (default: --size)")
+    parser.add_argument("--groups", type=int, default=10, help="Number of user and device groups (default: 10)")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    dataset = Dataset(args.size, args.audits, args.groups)
+    console = MockConsole(
+        dataset, args.host, args.port, args.latency, args.max_page_size,
+        args.audit_order, args.until_param, args.error_rate,
+    )
+    print(f"Mock console on {console.url} ({args.size} devices)", flush=True)
+    try:
+        console.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        console.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
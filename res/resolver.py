@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+"""
+Batch name -> GUID resolution for the console admin scripts.
+
+`Resolver.resolve()` turns a list of device IDs, user names, group names or
+strategy names into GUIDs:
+  1. values that already look like GUIDs are passed through,
+  2. fresh entries come from the local inventory cache,
+  3. a few remaining names are looked up concurrently with exact-match
+     requests; more than BULK_THRESHOLD trigger one paginated listing of the
+     whole entity list instead,
+and every miss is reported together instead of aborting on the first one.
+
+Entities fetched once are kept in an in-memory index on the Resolver, so one
+instance can be shared by several operations in the same process;
+`shared()` returns that instance for a console.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import api_client
+import inventory_cache
+
+# Above this many unresolved names a full listing beats per-name lookups
+BULK_THRESHOLD = 20
+
+# kind -> (list endpoint, key field, exact-lookup query parameter)
+KINDS = {
+    inventory_cache.DEVICE: ("/api/devices", "id", "id"),
+    inventory_cache.USER: ("/api/users", "name", "name"),
+    inventory_cache.DEVICE_GROUP: ("/api/device-groups", "name", "name"),
+    inventory_cache.USER_GROUP: ("/api/user-groups", "name", "name"),
+    inventory_cache.STRATEGY: ("/api/strategies", "name", None),
+}
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def is_guid(value):
+    return len(value) == 36 and value.count("-") == 4
+
+
+class Resolver:
+    def __init__(self, url, token, parallel=8):
+        self.url = url
+        self.token = token
+        self.parallel = max(1, parallel)
+        self._index = {kind: {} for kind in KINDS}
+        self._complete = set()
+        self._lock = threading.Lock()
+
+    @property
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def _remember(self, kind, rows):
+        key_field = KINDS[kind][1]
+        with self._lock:
+            index = self._index[kind]
+            for row in rows:
+                key = row.get(key_field)
+                if key is not None:
+                    index[str(key)] = row
+        inventory_cache.store(self.url, kind, rows, key_field)
+
+    def load_all(self, kind):
+        """Download the whole entity list once and index it"""
+        if kind in self._complete:
+            return
+        path, _, lookup_param = KINDS[kind]
+        if lookup_param is None:
+            # Not paginated
+            response = api_client.get(f"{self.url}{path}", headers=self.headers)
+            rows = api_client.check_page(response) or []
+        else:
+            rows = api_client.fetch_pages(
+                f"{self.url}{path}", self.headers, {}, parallel=self.parallel
+            )
+        self._remember(kind, rows)
+        self._complete.add(kind)
+
+    def _lookup(self, kind, name):
+        path, key_field, lookup_param = KINDS[kind]
+        params = {lookup_param: name, "pageSize": 50, "current": 1}
+        response = api_client.get(f"{self.url}{path}", headers=self.headers, params=params)
+        rows = api_client.check_page(response).get("data", [])
+        matches = [row for row in rows if str(row.get(key_field)) == name]
+        self._remember(kind, matches)
+
+    def rows(self, kind, names):
+        """
+        Resolve names to their full rows.
+        Returns (dict name -> row, list of names not found).
+        """
+        index = self._index[kind]
+        pending = []
+        for name in dict.fromkeys(names):
+            if name in index:
+                continue
+            row = inventory_cache.get(self.url, kind, name)
+            if row is not None:
+                index[name] = row
+            else:
+                pending.append(name)
+
+        if pending and kind not in self._complete:
+            if len(pending) > BULK_THRESHOLD or KINDS[kind][2] is None:
+                self.load_all(kind)
+            else:
+                api_client.ensure_pool_size(self.parallel)
+                with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+                    list(executor.map(lambda name: self._lookup(kind, name), pending))
+
+        found = {name: index[name] for name in names if name in index}
+        missing = [name for name in dict.fromkeys(names) if name not in index]
+        return found, missing
+
+    def resolve(self, kind, names):
+        """
+        Resolve names (or GUIDs, passed through) to GUIDs in input order.
+        Returns (list of GUIDs, list of names not found).
+        """
+        lookup = [name for name in names if not is_guid(name)]
+        found, missing = self.rows(kind, lookup) if lookup else ({}, [])
+        guids = [
+            name if is_guid(name) else found[name]["guid"]
+            for name in names
+            if is_guid(name) or name in found
+        ]
+        return guids, missing
+
+
+def shared(url, token):
+    """The process-wide Resolver of a console, created on first use"""
+    with _shared_lock:
+        key = (url, token)
+        if key not in _shared:
+            _shared[key] = Resolver(url, token)
+        return _shared[key]
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 
-import requests
 import argparse
 import json
 
+import api_client
+import inventory_cache
+import resolver as name_resolver
+
 
 def check_response(response):
     """
@@ -40,26 +43,30 @@ def headers_with(token):
 def list_strategies(url, token):
     """List all strategies"""
     headers = headers_with(token)
-    r = requests.get(f"{url}/api/strategies", headers=headers)
+    r = api_client.get(f"{url}/api/strategies", headers=headers)
     return check_response(r)
 
 
 def get_strategy_by_guid(url, token, guid):
     """Get strategy by GUID"""
     headers = headers_with(token)
-    r = requests.get(f"{url}/api/strategies/{guid}", headers=headers)
+    r = api_client.get(f"{url}/api/strategies/{guid}", headers=headers)
     return check_response(r)
 
 
 def get_strategy_by_name(url, token, name):
     """Get strategy by name"""
-    strategies = list_strategies(url, token)
-    if not strategies:
+    def fetch(name):
+        strategies = list_strategies(url, token)
+        if not strategies:
+            return None
+        inventory_cache.store(url, inventory_cache.STRATEGY, strategies, "name")
+        for s in strategies:
+            if str(s.get("name")) == name:
+                return s
         return None
-    for s in strategies:
-        if str(s.get("name")) == name:
-            return s
-    return None
+
+    return inventory_cache.lookup(url, inventory_cache.STRATEGY, name, fetch, "name")
 
 
 def enable_strategy(url, token, name):
@@ -70,7 +77,7 @@ def enable_strategy(url, token, name):
         print(f"Error: Strategy '{name}' not found")
         exit(1)
     guid = strategy.get("guid")
-    r = requests.put(f"{url}/api/strategies/{guid}/status", headers=headers, json=True)
+    r = api_client.put(f"{url}/api/strategies/{guid}/status", headers=headers, json=True)
     check_response(r)
     return "Success"
 
@@ -83,16 +90,16 @@ def disable_strategy(url, token, name):
         print(f"Error: Strategy '{name}' not found")
         exit(1)
     guid = strategy.get("guid")
-    r = requests.put(f"{url}/api/strategies/{guid}/status", headers=headers, json=False)
+    r = api_client.put(f"{url}/api/strategies/{guid}/status", headers=headers, json=False)
     check_response(r)
     return "Success"
 
 
-def get_device_guid_by_id(url, token, device_id):
-    """Get device GUID by device ID (exact match)"""
+def find_device_by_id(url, token, device_id):
+    """Get device by device ID (exact match)"""
     headers = headers_with(token)
     params = {"id": device_id, "pageSize": 50}
-    r = requests.get(f"{url}/api/devices", headers=headers, params=params)
+    r = api_client.get(f"{url}/api/devices", headers=headers, params=params)
     res = check_response(r)
     if not res:
         return None
@@ -100,15 +107,24 @@ def get_device_guid_by_id(url, token, device_id):
     devices_data = res.get("data", []) if isinstance(res, dict) else res
     for d in devices_data:
         if d.get("id") == device_id:
-            return d.get("guid")
+            return d
     return None
 
 
-def get_user_guid_by_name(url, token, name):
-    """Get user GUID by exact name match"""
+def get_device_guid_by_id(url, token, device_id):
+    """Get device GUID by device ID (exact match)"""
+    d = inventory_cache.lookup(
+        url, inventory_cache.DEVICE, device_id,
+        lambda key: find_device_by_id(url, token, key), "id"
+    )
+    return d.get("guid") if d else None
+
+
+def find_user_by_name(url, token, name):
+    """Get user by exact name match"""
     headers = headers_with(token)
     params = {"name": name, "pageSize": 50}
-    r = requests.get(f"{url}/api/users", headers=headers, params=params)
+    r = api_client.get(f"{url}/api/users", headers=headers, params=params)
     res = check_response(r)
     if not res:
         return None
@@ -116,15 +132,24 @@ def get_user_guid_by_name(url, token, name):
     users_data = res.get("data", []) if isinstance(res, dict) else res
     for u in users_data:
         if u.get("name") == name:
-            return u.get("guid")
+            return u
     return None
 
 
-def get_device_group_guid_by_name(url, token, name):
-    """Get device group GUID by exact name match"""
+def get_user_guid_by_name(url, token, name):
+    """Get user GUID by exact name match"""
+    u = inventory_cache.lookup(
+        url, inventory_cache.USER, name,
+        lambda key: find_user_by_name(url, token, key), "name"
+    )
+    return u.get("guid") if u else None
+
+
+def find_device_group_by_name(url, token, name):
+    """Get device group by exact name match"""
     headers = headers_with(token)
     params = {"pageSize": 50, "name": name}
-    r = requests.get(f"{url}/api/device-groups", headers=headers, params=params)
+    r = api_client.get(f"{url}/api/device-groups", headers=headers, params=params)
     res = check_response(r)
     if not res:
         return None
@@ -132,11 +157,21 @@ def get_device_group_guid_by_name(url, token, name):
     groups_data = res.get("data", []) if isinstance(res, dict) else res
     for g in groups_data:
         if g.get("name") == name:
-            return g.get("guid")
+            return g
     return None
 
 
-def assign_strategy(url, token, strategy_name, peers=None, users=None, device_groups=None):
+def get_device_group_guid_by_name(url, token, name):
+    """Get device group GUID by exact name match"""
+    g = inventory_cache.lookup(
+        url, inventory_cache.DEVICE_GROUP, name,
+        lambda key: find_device_group_by_name(url, token, key), "name"
+    )
+    return g.get("guid") if g else None
+
+
+def assign_strategy(url, token, strategy_name, peers=None, users=None, device_groups=None,
+                    resolver=None):
     """
     Assign strategy to peers, users, or device groups
     
@@ -145,6 +180,7 @@ def assign_strategy(url, token, strategy_name, peers=None, users=None, device_gr
         peers: List of device IDs or GUIDs
         users: List of user names or GUIDs
         device_groups: List of device group names or GUIDs
+        resolver: Resolver to reuse for name lookups (the process-wide one by default)
     """
     headers = headers_with(token)
     
@@ -157,50 +193,22 @@ def assign_strategy(url, token, strategy_name, peers=None, users=None, device_gr
             exit(1)
         strategy_guid = strategy.get("guid")
     
-    # Convert device IDs to GUIDs
-    peer_guids = []
-    if peers:
-        for peer in peers:
-            # Check if it's already a GUID format
-            if len(peer) == 36 and peer.count('-') == 4:
-                peer_guids.append(peer)
-            else:
-                # Treat as device ID, look it up
-                guid = get_device_guid_by_id(url, token, peer)
-                if not guid:
-                    print(f"Error: Device '{peer}' not found")
-                    exit(1)
-                peer_guids.append(guid)
-    
-    # Convert user names to GUIDs
-    user_guids = []
-    if users:
-        for user in users:
-            # Check if it's already a GUID format
-            if len(user) == 36 and user.count('-') == 4:
-                user_guids.append(user)
-            else:
-                # Treat as username, look it up
-                guid = get_user_guid_by_name(url, token, user)
-                if not guid:
-                    print(f"Error: User '{user}' not found")
-                    exit(1)
-                user_guids.append(guid)
-    
-    # Convert device group names to GUIDs
-    device_group_guids = []
-    if device_groups:
-        for dg in device_groups:
-            # Check if it's already a GUID format
-            if len(dg) == 36 and dg.count('-') == 4:
-                device_group_guids.append(dg)
-            else:
-                # Treat as device group name, look it up
-                guid = get_device_group_guid_by_name(url, token, dg)
-                if not guid:
-                    print(f"Error: Device group '{dg}' not found")
-                    exit(1)
-                device_group_guids.append(guid)
+    # Resolve all device IDs, user names and device group names in one pass
+    resolver = resolver or name_resolver.shared(url, token)
+    peer_guids, missing_peers = resolver.resolve(inventory_cache.DEVICE, peers or [])
+    user_guids, missing_users = resolver.resolve(inventory_cache.USER, users or [])
+    device_group_guids, missing_groups = resolver.resolve(
+        inventory_cache.DEVICE_GROUP, device_groups or []
+    )
+    errors = (
+        [f"Device '{peer}' not found" for peer in missing_peers]
+        + [f"User '{user}' not found" for user in missing_users]
+        + [f"Device group '{dg}' not found" for dg in missing_groups]
+    )
+    if errors:
+        for error in errors:
+            print(f"Error: {error}")
+        exit(1)
     
     # Build payload
     payload = {}
@@ -211,11 +219,11 @@ def assign_strategy(url, token, strategy_name, peers=None, users=None, device_gr
     payload["users"] = user_guids
     payload["groups"] = device_group_guids
     
-    r = requests.post(f"{url}/api/strategies/assign", headers=headers, json=payload)
+    r = api_client.post(f"{url}/api/strategies/assign", headers=headers, json=payload, idempotent=True)
     check_response(r)
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Strategy manager")
     parser.add_argument("command", choices=[
         "list", "view", "enable", "disable", "assign", "unassign"
@@ -231,7 +239,12 @@ def main():
     parser.add_argument("--users", help="Comma separated user names or GUIDs (requires User Permission:r)")
     parser.add_argument("--device-groups", help="Comma separated device group names or GUIDs (requires Device Group Permission:r)")
 
-    args = parser.parse_args()
+    inventory_cache.add_cache_arguments(parser)
+    api_client.add_client_arguments(parser)
+
+    args = parser.parse_args(argv)
+    api_client.configure_from_args(args)
+    inventory_cache.configure_from_args(args)
     while args.url.endswith("/"): args.url = args.url[:-1]
 
     if args.command == "list":
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+Audit paging against mock_console.py with a server that caps pageSize.
+
+    python3 -m unittest test_audits
+"""
+
+import time
+import unittest
+
+import audits
+import mock_console
+
+AUDITS = 2345
+MAX_PAGE_SIZE = 100
+
+
+class CappedServerTest(unittest.TestCase):
+    """Every pager must read all rows when pages come back shorter than asked"""
+
+    @classmethod
+    def setUpClass(cls):
+        dataset = mock_console.Dataset(size=100, audits=AUDITS)
+        cls.console = mock_console.MockConsole(
+            dataset, port=0, max_page_size=MAX_PAGE_SIZE, until_param="created_at_lt"
+        ).start()
+        cls.url = cls.console.url
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.console.stop()
+
+    def test_iter_audit_pages(self):
+        ids = [
+            row["id"]
+            for _, rows in audits.iter_audit_pages(self.url, "t", "conn", {}, 1000)
+            for row in rows
+        ]
+        self.assertEqual(sorted(ids), list(range(AUDITS)))
+
+    def test_fetch_window(self):
+        end = time.time() + 60
+        rows = audits.fetch_window(
+            self.url, "t", "conn", {}, end - 40 * 86400, end, page_size=1000,
+            until_param="created_at_lt",
+        )
+        self.assertEqual(sorted(row["id"] for row in rows), list(range(AUDITS)))
+
+    def test_poll_new_audits(self):
+        rows, cursor = audits.poll_new_audits(self.url, "t", "conn", {}, {}, page_size=1000)
+        self.assertEqual(sorted(row["id"] for row in rows), list(range(AUDITS)))
+        rows, _ = audits.poll_new_audits(self.url, "t", "conn", {}, cursor, page_size=1000)
+        self.assertEqual(rows, [])
+
+    def test_iter_live_audits(self):
+        rows = audits.iter_live_audits(self.url, "t", "conn", {}, page_size=1000)
+        stats = audits.compute_audit_stats([("conn", rows)])
+        self.assertEqual(stats["rows"], AUDITS)
+
+
+if __name__ == "__main__":
+    unittest.main()
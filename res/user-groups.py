@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 
-import requests
 import argparse
 import json
+import sys
+
+import api_client
+import inventory_cache
+import resolver as name_resolver
 
 
 def check_response(response):
@@ -37,29 +41,12 @@ def headers_with(token):
 
 # ---------- User Group APIs ----------
 
-def list_groups(url, token, name=None, page_size=50):
+def list_groups(url, token, name=None, page_size=None):
     headers = headers_with(token)
-    params = {"pageSize": page_size}
+    params = {}
     if name:
         params["name"] = name
-    data, current = [], 0
-    while True:
-        current += 1
-        params["current"] = current
-        r = requests.get(f"{url}/api/user-groups", headers=headers, params=params)
-        if r.status_code != 200:
-            print(f"Error: HTTP {r.status_code} - {r.text}")
-            exit(1)
-        res = r.json()
-        if "error" in res:
-            print(f"Error: {res['error']}")
-            exit(1)
-        rows = res.get("data", [])
-        data.extend(rows)
-        total = res.get("total", 0)
-        if len(rows) < page_size or current * page_size >= total:
-            break
-    return data
+    return api_client.fetch_pages(f"{url}/api/user-groups", headers, params, page_size)
 
 
 def get_group_by_name(url, token, name):
@@ -79,7 +66,7 @@ def create_group(url, token, name, note=None, accessed_from=None, access_to=None
         payload["allowed_incomings"] = accessed_from
     if access_to:
         payload["allowed_outgoings"] = access_to
-    r = requests.post(f"{url}/api/user-groups", headers=headers, json=payload)
+    r = api_client.post(f"{url}/api/user-groups", headers=headers, json=payload)
     return check_response(r)
 
 
@@ -99,7 +86,7 @@ def update_group(url, token, name, new_name=None, note=None, accessed_from=None,
         payload["allowed_incomings"] = accessed_from
     if access_to is not None:
         payload["allowed_outgoings"] = access_to
-    r = requests.patch(f"{url}/api/user-groups/{guid}", headers=headers, json=payload)
+    r = api_client.patch(f"{url}/api/user-groups/{guid}", headers=headers, json=payload)
     check_response(r)
     return "Success"
 
@@ -114,14 +101,14 @@ def delete_groups(url, token, names):
             print(f"Error: Group '{n}' not found")
             exit(1)
         guid = g.get("guid")
-        r = requests.delete(f"{url}/api/user-groups/{guid}", headers=headers)
+        r = api_client.delete(f"{url}/api/user-groups/{guid}", headers=headers)
         check_response(r)
     return "Success"
 
 
 # ---------- User management in group ----------
 
-def view_users(url, token, group_name=None, name=None, page_size=50):
+def view_users(url, token, group_name=None, name=None, page_size=None):
     """View users in a user group with filters"""
     headers = headers_with(token)
     
@@ -140,26 +127,16 @@ def view_users(url, token, group_name=None, name=None, page_size=50):
         if v is not None:
             params[k] = "%" + v + "%" if (v != "-" and "%" not in v) else v
     
-    params["pageSize"] = page_size
-    
-    data, current = [], 0
-    while True:
-        current += 1
-        params["current"] = current
-        r = requests.get(f"{url}/api/users", headers=headers, params=params)
-        if r.status_code != 200:
-            return check_response(r)
-        res = r.json()
-        rows = res.get("data", [])
-        data.extend(rows)
-        total = res.get("total", 0)
-        if len(rows) < page_size or current * page_size >= total:
-            break
-    return data
-
-
-def add_users(url, token, group_name, user_names):
-    """Add users to a user group"""
+    return api_client.fetch_pages(f"{url}/api/users", headers, params, page_size)
+
+
+def add_users(url, token, group_name, user_names, chunk_size=500, resolver=None):
+    """
+    Add users to a user group
+
+    All names are resolved in one batch (see resolver.Resolver) and the
+    GUIDs are posted in chunks of `chunk_size`.
+    """
     headers = headers_with(token)
     if isinstance(user_names, str):
         user_names = [user_names]
@@ -172,30 +149,15 @@ def add_users(url, token, group_name, user_names):
     guid = g.get("guid")
     
     # Get user GUIDs
-    user_guids = []
-    errors = []
-    
-    for user_name in user_names:
-        # Get user by exact name match
-        params = {"name": user_name, "pageSize": 50}
-        r = requests.get(f"{url}/api/users", headers=headers, params=params)
-        if r.status_code != 200:
-            errors.append(f"{user_name}: HTTP {r.status_code}")
-            continue
-        
-        users_data = r.json()
-        users_list = users_data.get("data", [])
-        user = None
-        for u in users_list:
-            if u.get("name") == user_name:
-                user = u
-                break
-        
-        if not user:
-            errors.append(f"{user_name}: User not found")
-            continue
-        
-        user_guids.append(user["guid"])
+    resolver = resolver or name_resolver.shared(url, token)
+    found, missing = resolver.rows(inventory_cache.USER, user_names)
+    # guid -> name, in input order
+    names_by_guid = {}
+    for name in user_names:
+        if name in found:
+            names_by_guid.setdefault(found[name]["guid"], name)
+    user_guids = list(names_by_guid)
+    errors = [f"{user_name}: User not found" for user_name in missing]
     
     if not user_guids:
         msg = "Error: No valid users found"
@@ -205,8 +167,20 @@ def add_users(url, token, group_name, user_names):
         exit(1)
     
     # Add users to group using POST /api/user-groups/:guid
-    r = requests.post(f"{url}/api/user-groups/{guid}", headers=headers, json=user_guids)
-    check_response(r)
+    chunk_size = max(1, chunk_size)
+    for start in range(0, len(user_guids), chunk_size):
+        chunk = user_guids[start:start + chunk_size]
+        r = api_client.post(f"{url}/api/user-groups/{guid}", headers=headers, json=chunk, idempotent=True)
+        try:
+            check_response(r)
+        except SystemExit:
+            if start:
+                print(
+                    f"Added {start} of {len(user_guids)} user(s) to group '{group_name}' "
+                    f"(through '{names_by_guid[user_guids[start - 1]]}') before the error; "
+                    "adding is idempotent, so re-running the command is safe"
+                )
+            raise
     
     success_msg = f"Success: Added {len(user_guids)} user(s) to group '{group_name}'"
     if errors:
@@ -214,6 +188,16 @@ def add_users(url, token, group_name, user_names):
     return success_msg
 
 
+def read_names(path):
+    """Read one name per line from a file, or from stdin when path is '-'"""
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        return [line.strip() for line in stream if line.strip()]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
 def parse_rules(s):
     if not s:
         return None
@@ -227,7 +211,7 @@ def parse_rules(s):
     return None
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="User Group manager")
     parser.add_argument("command", choices=[
         "view", "add", "update", "delete",
@@ -248,11 +232,18 @@ def main():
     parser.add_argument("--access-to", help="JSON array: '[{\"type\":0|1,\"name\":\"...\"}]' (0=User Group, 1=Device Group)")
 
     parser.add_argument("--users", help="Comma separated usernames for add-users")
+    parser.add_argument("--users-file", help="File with one username per line for add-users ('-' for stdin)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Max users per add-users request (default: 500)")
     
     # Filters for view-users command
     parser.add_argument("--user-name", help="User name filter (for view-users, supports fuzzy search)")
 
-    args = parser.parse_args()
+    inventory_cache.add_cache_arguments(parser)
+    api_client.add_client_arguments(parser)
+
+    args = parser.parse_args(argv)
+    api_client.configure_from_args(args)
+    inventory_cache.configure_from_args(args)
     while args.url.endswith("/"): args.url = args.url[:-1]
 
     if args.command == "view":
@@ -291,11 +282,13 @@ def main():
         )
         print(json.dumps(res, indent=2))
     elif args.command == "add-users":
-        if not args.name or not args.users:
-            print("Error: --name and --users are required")
+        if not args.name or not (args.users or args.users_file):
+            print("Error: --name and --users or --users-file are required")
             exit(1)
-        users = [x.strip() for x in args.users.split(",") if x.strip()]
-        print(add_users(args.url, args.token, args.name, users))
+        users = [x.strip() for x in args.users.split(",") if x.strip()] if args.users else []
+        if args.users_file:
+            users += read_names(args.users_file)
+        print(add_users(args.url, args.token, args.name, users, max(1, args.chunk_size)))
 
 
 if __name__ == "__main__":
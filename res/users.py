@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 
-import requests
 import argparse
 from datetime import datetime, timedelta
 
+import api_client
+
 
 def check_response(response):
     """
@@ -34,7 +35,6 @@ def view(
     group_name=None,
 ):
     headers = {"Authorization": f"Bearer {token}"}
-    pageSize = 30
     params = {
         "name": name,
         "group_name": group_name,
@@ -45,53 +45,28 @@ def view(
         for k, v in params.items()
         if v is not None
     }
-    params["pageSize"] = pageSize
-
-    users = []
-
-    current = 0
-
-    while True:
-        current += 1
-        params["current"] = current
-        response = requests.get(f"{url}/api/users", headers=headers, params=params)
-        if response.status_code != 200:
-            print(f"Error: HTTP {response.status_code} - {response.text}")
-            exit(1)
-        
-        response_json = response.json()
-        if "error" in response_json:
-            print(f"Error: {response_json['error']}")
-            exit(1)
-
-        data = response_json.get("data", [])
-        users.extend(data)
 
-        total = response_json.get("total", 0)
-        if len(data) < pageSize or current * pageSize >= total:
-            break
-
-    return users
+    return api_client.fetch_pages(f"{url}/api/users", headers, params)
 
 
 def disable(url, token, guid, name):
     print("Disable", name)
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.post(f"{url}/api/users/{guid}/disable", headers=headers)
+    response = api_client.post(f"{url}/api/users/{guid}/disable", headers=headers, idempotent=True)
     check_response(response)
 
 
 def enable(url, token, guid, name):
     print("Enable", name)
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.post(f"{url}/api/users/{guid}/enable", headers=headers)
+    response = api_client.post(f"{url}/api/users/{guid}/enable", headers=headers, idempotent=True)
     check_response(response)
 
 
 def delete_user(url, token, guid, name):
     print("Delete", name)
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.delete(f"{url}/api/users/{guid}", headers=headers)
+    response = api_client.delete(f"{url}/api/users/{guid}", headers=headers)
     check_response(response)
 
 
@@ -108,7 +83,7 @@ def new_user(url, token, name, password, group_name=None, email=None, note=None)
         payload["email"] = email
     if note:
         payload["note"] = note
-    response = requests.post(f"{url}/api/users", headers=headers, json=payload)
+    response = api_client.post(f"{url}/api/users", headers=headers, json=payload)
     check_response(response)
 
 
@@ -123,7 +98,7 @@ def invite_user(url, token, email, name, group_name=None, note=None):
         payload["group_name"] = group_name
     if note:
         payload["note"] = note
-    response = requests.post(f"{url}/api/users/invite", headers=headers, json=payload)
+    response = api_client.post(f"{url}/api/users/invite", headers=headers, json=payload)
     check_response(response)
 
 
@@ -135,7 +110,7 @@ def enable_2fa_enforce(url, token, user_guids, base_url):
         "enforce": True,
         "url": base_url
     }
-    response = requests.put(f"{url}/api/users/tfa/totp/enforce", headers=headers, json=payload)
+    response = api_client.put(f"{url}/api/users/tfa/totp/enforce", headers=headers, json=payload)
     check_response(response)
 
 
@@ -147,7 +122,7 @@ def disable_2fa_enforce(url, token, user_guids, base_url=""):
         "enforce": False,
         "url": base_url
     }
-    response = requests.put(f"{url}/api/users/tfa/totp/enforce", headers=headers, json=payload)
+    response = api_client.put(f"{url}/api/users/tfa/totp/enforce", headers=headers, json=payload)
     check_response(response)
 
 
@@ -158,7 +133,7 @@ def disable_email_verification(url, token, user_guids):
         "user_guids": user_guids if isinstance(user_guids, list) else [user_guids],
         "type": "email"
     }
-    response = requests.put(f"{url}/api/users/disable_login_verification", headers=headers, json=payload)
+    response = api_client.put(f"{url}/api/users/disable_login_verification", headers=headers, json=payload)
     check_response(response)
 
 
@@ -169,7 +144,7 @@ def reset_2fa(url, token, user_guids):
         "user_guids": user_guids if isinstance(user_guids, list) else [user_guids],
         "type": "2fa"
     }
-    response = requests.put(f"{url}/api/users/disable_login_verification", headers=headers, json=payload)
+    response = api_client.put(f"{url}/api/users/disable_login_verification", headers=headers, json=payload)
     check_response(response)
 
 
@@ -179,11 +154,11 @@ def force_logout(url, token, user_guids):
     payload = {
         "user_guids": user_guids if isinstance(user_guids, list) else [user_guids],
     }
-    response = requests.post(f"{url}/api/users/force-logout", headers=headers, json=payload)
+    response = api_client.post(f"{url}/api/users/force-logout", headers=headers, json=payload, idempotent=True)
     check_response(response)
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="User manager")
     parser.add_argument(
         "command",
@@ -202,8 +177,12 @@ def main():
     parser.add_argument("--email", help="User email (for invite command)")
     parser.add_argument("--note", help="User note (for new/invite command)")
     parser.add_argument("--web-console-url", help="Web console URL (for 2FA enforce commands)")
+    parser.add_argument("--yes", action="store_true", help="Do not ask for confirmation when several users match")
+
+    api_client.add_client_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    api_client.configure_from_args(args)
 
     while args.url.endswith("/"): args.url = args.url[:-1]
 
@@ -243,7 +222,7 @@ def main():
             return
         
         # Check if we need user confirmation for multiple users
-        if len(users) > 1:
+        if len(users) > 1 and not args.yes:
             print(f"Found {len(users)} users. Do you want to proceed with {args.command} operation on the users? (Y/N)")
             confirmation = input("Type 'Y' to confirm: ").strip()
             if confirmation.upper() != 'Y':